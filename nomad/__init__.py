@@ -1 +1,4 @@
-__all__ = ['entity', 'entities', 'game', 'nomad', 'plains', 'roles', 'util']
+__all__ = ['batch', 'bench', 'commands', 'content', 'crafting', 'entity',
+           'entities', 'events', 'fov', 'game', 'loop', 'nomad', 'pathfind',
+           'plains', 'plainsgen', 'replay', 'roles', 'scheduler',
+           'simulation', 'snapshot', 'spatial', 'telemetry', 'util', 'world']
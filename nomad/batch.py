@@ -0,0 +1,199 @@
+'''run many seeded headless games at once, for balance tuning
+
+Each game is a `Simulation` driven by a policy instead of the keyboard.
+Games are spread over a pool of processes, and a compact result for each
+is streamed to a CSV or JSON Lines file as soon as it is known.
+
+Run with ``python -m nomad.batch``.
+'''
+import argparse
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import json
+import os
+import random
+import sys
+
+from nomad import entities
+from nomad.commands import DIRECTION_NAMES, game_command_names
+from nomad.content import default as default_content
+import nomad.plainsgen as gen
+from nomad.simulation import Simulation
+from nomad.util import *
+
+#: The fields of each result, in the order they are written.
+FIELDS = ('seed', 'policy', 'turns', 'cause_of_death', 'crafted',
+          'satiation', 'health')
+
+_direction_names = dict((xy, name) for name, xy in DIRECTION_NAMES.items())
+
+
+def wander(sim, rng):
+    '''Yield command and direction names chosen at random, forever.'''
+    names = game_command_names()
+    while True:
+        yield rng.choice(names)
+
+
+def forager(sim, rng):
+    '''Eat the mushrooms underfoot, gather the parts of whatever the
+    nomad can make and make it, and otherwise walk towards food and parts,
+    or wander.
+    '''
+    nomad = sim.nomad
+    plains = sim.plains
+    tactile = nomad.as_tactile
+    parts = tactile.recipes.ingredient_names
+    intelligence = nomad.stats.intelligence
+    while True:
+        held = set(e.name for e in tactile.held_entities if e)
+        underfoot = nomad.get_underfoot()
+        if underfoot.name == 'mushroom':
+            yield 'eat'
+            yield 'here'
+            continue
+        if (underfoot.name in parts and underfoot.name not in held and
+                None in tactile.held_entities):
+            yield 'pickup'
+            yield 'here'
+            continue
+        if tactile.recipes.best(held, intelligence) is not None:
+            yield 'combine'
+            continue
+
+        # Walk towards the nearest mushroom or wanted part.
+        targets = [plains.nearest(nomad.x, nomad.y, name)
+                   for name in ['mushroom'] + sorted(parts - held)]
+        targets = [xy for xy in targets if xy is not None]
+        if targets:
+            x, y = min(targets, key=lambda xy: max(abs(xy.x - nomad.x),
+                                                   abs(xy.y - nomad.y)))
+            dx = (x > nomad.x) - (x < nomad.x)
+            dy = (y > nomad.y) - (y < nomad.y)
+            if plains.walkable_at(nomad.x + dx, nomad.y + dy):
+                yield _direction_names[(dx, dy)]
+                continue
+        yield _direction_names[rng.choice(DIRECTIONS)]
+
+
+#: Policies by name. A policy is called with a `Simulation` and a
+#: `random.Random`, and returns an iterable of the simulation's commands.
+policies = {
+    'wander': wander,
+    'forager': forager,
+    }
+
+
+def chance_table(table):
+    '''Return a `plainsgen.chance` table from a mapping of probabilities
+    to entity kind names (see `entities.kinds`), such as one read from
+    JSON.
+    '''
+    return dict((int(p), entities.kinds[name]) for p, name in table.items())
+
+
+def play(seed, table=None, policy='wander', los=6, turns=None, biomes=False,
+         **world_kws):
+    '''Play one game seeded with `seed` and return its result.
+
+    `table` maps probabilities to entity kind names, as for
+    `chance_table`. If `biomes` is true, the plains is laid out in the
+    biomes of the content file instead (see `plainsgen.biomes`). If
+    neither is given, the plains is generated as in a normal game. The
+    game ends when the nomad dies or, if given, after `turns` turns. Any
+    other keyword arguments are passed on to `new_world`.
+    '''
+    random.seed(seed)
+    generate = None
+    if biomes:
+        generate = default_content().biome_generator(entities.kinds, seed)
+    elif table is not None:
+        generate = gen.chance(chance_table(table), seed)
+    sim = Simulation((), los, generate, seed, **world_kws)
+    sim.commands = iter(policies[policy](sim, random.Random(seed)))
+    played = sim.run(turns)
+    mortal = sim.nomad.as_mortal
+    return dict(seed=seed, policy=policy, turns=played,
+                cause_of_death=mortal.cause_of_death,
+                crafted=sim.nomad.as_tactile.crafted,
+                satiation=mortal.satiation, health=mortal.health)
+
+
+def play_all(seeds, workers=None, **play_kws):
+    '''Play a game for each seed across `workers` processes, yielding
+    each result in seed order as soon as it is known.
+
+    `workers` defaults to the number of CPUs. Any keyword arguments are
+    passed on to `play`.
+    '''
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    # Hand out seeds in chunks, so that the workers stay busy without
+    # paying for a round trip per game.
+    chunksize = max(1, len(seeds) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(partial(play, **play_kws), seeds,
+                                chunksize=chunksize)
+
+
+def write_results(results, f, fmt='jsonl'):
+    '''Write each result to the file `f` as it arrives, as CSV or JSON
+    Lines according to `fmt`. Return the number of results written.
+    '''
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    elif fmt == 'jsonl':
+        write = lambda result: f.write(json.dumps(result) + '\n')
+    else:
+        raise ValueError('unknown format {!r}'.format(fmt))
+    n = 0
+    for n, result in enumerate(results, 1):
+        write(result)
+        f.flush()
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=100,
+                        help='games to play')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game; the rest count up')
+    parser.add_argument('--workers', type=int,
+                        help='processes to play on (default: one per CPU)')
+    parser.add_argument('--policy', choices=sorted(policies),
+                        default='wander')
+    terrain = parser.add_mutually_exclusive_group()
+    terrain.add_argument('--table', metavar='JSON', type=json.loads,
+                         help='generator table mapping probabilities to '
+                              'entity kinds, e.g. \'{"90": "grass"}\'')
+    terrain.add_argument('--biomes', action='store_true',
+                         help='lay the plains out in biomes')
+    parser.add_argument('--los', type=int, default=6)
+    parser.add_argument('--turns', type=int,
+                        help='stop each game after this many turns')
+    parser.add_argument('--out', metavar='PATH',
+                        help='file to write results to (default: stdout)')
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help='output format (default: from the --out '
+                             'extension, else jsonl)')
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'csv' if args.out and args.out.endswith('.csv') else 'jsonl'
+    results = play_all(range(args.seed, args.seed + args.runs), args.workers,
+                       table=args.table, policy=args.policy, los=args.los,
+                       turns=args.turns, biomes=args.biomes)
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            write_results(results, f, fmt)
+    else:
+        write_results(results, sys.stdout, fmt)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+'''benchmarks for tracking performance across releases
+
+Run with ``python -m nomad.bench``.
+'''
+import argparse
+import random
+import time
+import tracemalloc
+
+from nomad.entities import yak
+from nomad.simulation import Simulation, random_commands, update_entities
+from nomad.telemetry import stats as telemetry
+from nomad.util import *
+
+
+def timed(func, repeat):
+    '''Call `func` `repeat` times and return the mean time per call in
+    seconds.
+    '''
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def new_simulation(los, seed):
+    random.seed(seed)
+    return Simulation(random_commands(seed), los=los, seed=seed)
+
+
+def bench_turns(los, turns, seed):
+    '''Return turns played per second.'''
+    sim = new_simulation(los, seed)
+    start = time.perf_counter()
+    played = sim.run(turns)
+    return played / (time.perf_counter() - start)
+
+
+def bench_shift(los, repeat, seed):
+    '''Return the mean cost of shifting the plains one step.'''
+    plains = new_simulation(los, seed).plains
+    dirs = iter(DIRECTIONS * repeat)
+    return timed(lambda: plains.shift(*next(dirs)), repeat)
+
+
+def bench_update(los, repeat, seed):
+    '''Return the mean cost of updating every entity once.'''
+    sim = new_simulation(los, seed)
+    return timed(lambda: update_entities(sim.nomad, sim.plains), repeat)
+
+
+def bench_generate(los, repeat, seed):
+    '''Return the mean cost of generating the plains' leading edge.'''
+    plains = new_simulation(los, seed).plains
+    _, entering = plains.entities.edges(*DIR_LEFT)
+    return timed(lambda: plains.generate(plains, entering), repeat)
+
+
+def allocated(func):
+    '''Call `func` and return the number of bytes it allocated that are
+    still alive once it returns, along with its result.
+    '''
+    tracemalloc.start()
+    try:
+        result = func()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def bench_memory(los, seed):
+    '''Return the memory held by a new game, in bytes.'''
+    size, _ = allocated(lambda: new_simulation(los, seed))
+    return size
+
+
+def bench_entity_size(n=1000):
+    '''Return the mean memory held by an entity with a role, in bytes.'''
+    size, _ = allocated(lambda: [yak() for _ in range(n)])
+    return size / n
+
+
+def run(los_values, turns, repeat, seed):
+    '''Run each benchmark at each line of sight and print the results.'''
+    print('entity size: {:.0f} B'.format(bench_entity_size()))
+    print('{:>5} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+          'los', 'turns/s', 'shift us', 'update us', 'generate us',
+          'memory KiB'))
+    for los in los_values:
+        print('{:>5} {:>12.0f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.0f}'.format(
+              los,
+              bench_turns(los, turns, seed),
+              bench_shift(los, repeat, seed) * 1e6,
+              bench_update(los, repeat, seed) * 1e6,
+              bench_generate(los, repeat, seed) * 1e6,
+              bench_memory(los, seed) / 1024))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--los', type=int, nargs='+', default=[6, 12, 25, 50],
+                        help='line of sight values to benchmark at')
+    parser.add_argument('--turns', type=int, default=500,
+                        help='turns to play when measuring turns/s')
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='calls to average each cost over')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stats', metavar='PATH',
+                        help='write telemetry stats to PATH')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the benchmarks (requires --stats)')
+    args = parser.parse_args(argv)
+    if args.profile:
+        telemetry.start_profiling()
+    run(args.los, args.turns, args.repeat, args.seed)
+    if args.stats:
+        telemetry.dump(args.stats)
+
+
+if __name__ == '__main__':
+    main()
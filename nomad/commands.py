@@ -0,0 +1,70 @@
+'''player commands, independent of any user interface'''
+from nomad.telemetry import stats as telemetry
+from nomad.util import *
+
+DIRECTION_NAMES = {
+    'here': (0, 0),
+    'up': DIR_UP,
+    'down': DIR_DOWN,
+    'left': DIR_LEFT,
+    'right': DIR_RIGHT,
+    'upleft': DIR_UPLEFT,
+    'upright': DIR_UPRIGHT,
+    'downleft': DIR_DOWNLEFT,
+    'downright': DIR_DOWNRIGHT,
+    }
+
+#: Commands that don't touch the game, which headless drivers and
+#: recordings leave out.
+INTERFACE_COMMANDS = frozenset(['profile'])
+
+
+def move(dx, dy):
+    '''Return a command that moves the nomad in the given direction.'''
+    def move_nomad(nomad):
+        nomad.move(dx, dy)
+    return move_nomad
+
+
+def wait(nomad):
+    nomad.wait()
+
+def eat_nearest(nomad):
+    nomad.as_tactile.eat_nearest()
+
+def pickup_nearest(nomad):
+    nomad.as_tactile.pickup_nearest()
+
+def drop_all(nomad):
+    nomad.as_tactile.drop_all()
+
+def combine_objects(nomad):
+    nomad.as_tactile.combine_objects()
+
+def toggle_profiling(nomad):
+    telemetry.toggle_profiling()
+
+
+def named_commands():
+    '''Return a dict mapping command names to functions that perform
+    them.
+
+    Each function should take a `Nomad` as its single argument.
+    '''
+    commands = dict((name, move(*d)) for name, d in DIRECTION_NAMES.items())
+    commands.update({
+        'wait': wait,
+        'eat': eat_nearest,
+        'pickup': pickup_nearest,
+        'drop': drop_all,
+        'combine': combine_objects,
+        'profile': toggle_profiling,
+        })
+    return commands
+
+
+def game_command_names():
+    '''Return the sorted names of the commands that play the game: all
+    but the `INTERFACE_COMMANDS`.
+    '''
+    return sorted(set(named_commands()) - INTERFACE_COMMANDS)
@@ -0,0 +1,274 @@
+'''the game's content, declared as data
+
+Entity kinds and their glyphs, the generator's probabilities, biomes,
+recipes and keybindings are declared in a JSON file (by default,
+``content.json`` beside this module), so that balancing the game needs
+no code changes.
+
+`load` compiles a content file into `Content`: kind ids, glyph and color
+arrays indexed by kind id, a cumulative probability table for the
+generator, and so on. Compiling is cached on disk, keyed by a hash of
+the file, so that startup doesn't slow down as content grows.
+'''
+from array import array
+import curses
+from functools import lru_cache
+import hashlib
+import json
+import os
+import pickle
+
+from nomad import events, roles
+from nomad.commands import named_commands
+from nomad.crafting import Recipe, RecipeBook
+from nomad.entity import Archetype
+import nomad.plainsgen as gen
+
+#: Bumped whenever `compile_content` changes what it makes, so that old
+#: caches are not used.
+VERSION = 2
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'content.json')
+
+#: The directory compiled content is cached in.
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'nomad')
+
+#: curses color pair numbers by color name (see `nomad.interface`).
+COLOR_PAIRS = {
+    'red': 1,
+    'green': 2,
+    'yellow': 3,
+    'blue': 4,
+    'magenta': 5,
+    'cyan': 6,
+    'white': 7,
+    }
+
+#: Role classes by role name.
+ROLE_CLASSES = {
+    'matter': roles.Matter,
+    'edible': roles.Edible,
+    'usable': roles.Usable,
+    'weapon': roles.Weapon,
+    'actor': roles.Actor,
+    'reactor': roles.Reactor,
+    }
+
+#: Role arguments naming a function, looked up in the actions given to
+#: `Content.archetypes`.
+ACTION_ARGS = ('on_use', 'action')
+
+
+class Content:
+    '''Compiled game content.
+
+    Kinds are numbered in the order they are declared: ``kind_names``
+    holds the name of each kind by its id, and ``glyphs`` and ``colors``
+    its character and curses color pair number. ``kinds`` holds the
+    declaration of each kind that is made from an `Archetype`, by name.
+
+    The generator's table is held as ``generator_kinds``, the names of
+    the kinds it may place in order of probability, with
+    ``cum_weights``, their cumulative probabilities out of 100 (see
+    `nomad.plainsgen.Table`). ``biomes`` holds the declaration of each
+    biome, its tables compiled likewise as (kind names, cumulative
+    weights) pairs. ``recipes`` holds the declaration of each recipe,
+    and ``keys`` maps key names to command names.
+    '''
+
+    def __init__(self, digest, kind_names, glyphs, colors, kinds,
+                 generator_kinds, cum_weights, biomes, recipes, keys):
+        self.digest = digest
+        self.kind_names = kind_names
+        self.kind_ids = dict((name, i) for i, name in enumerate(kind_names))
+        self.glyphs = glyphs
+        self.colors = colors
+        self.kinds = kinds
+        self.generator_kinds = generator_kinds
+        self.cum_weights = cum_weights
+        self.biomes = biomes
+        self.recipes = recipes
+        self.keys = keys
+
+    def render_info(self):
+        '''Return a dict mapping kind names to (char, pair_num).'''
+        return dict((name, (self.glyphs[i], self.colors[i]))
+                    for i, name in enumerate(self.kind_names))
+
+    def archetypes(self, actions):
+        '''Return an `Archetype` for each declared kind, by name.
+
+        `actions` maps the names of functions that roles are declared
+        with, such as a usable's ``on_use``, to the functions.
+        '''
+        archetypes = {}
+        for name, kind in self.kinds.items():
+            kind_roles = {}
+            for role_name, args in kind['roles'].items():
+                args = dict(args)
+                for arg in ACTION_ARGS:
+                    if arg in args:
+                        args[arg] = actions[args[arg]]
+                if 'events' in args:
+                    args['events'] = [getattr(events, event)
+                                      for event in args['events']]
+                kind_roles[role_name] = ROLE_CLASSES[role_name](**args)
+            archetypes[name] = Archetype(
+                name, kind['walkable'], kind['moveable'], roles=kind_roles,
+                shared=kind['shared'])
+        return archetypes
+
+    def generator_table(self, archetypes):
+        '''Return the generator's `nomad.plainsgen.Table`, given the
+        archetypes by name.
+        '''
+        return gen.Table.compiled(
+            [archetypes[name] for name in self.generator_kinds],
+            self.cum_weights)
+
+    def biome_generator(self, archetypes, seed=None):
+        '''Return a `nomad.plainsgen.biomes` generator of the biomes,
+        given the archetypes by name.
+        '''
+        def table(compiled):
+            if compiled is None:
+                return None
+            names, cum_weights = compiled
+            return gen.Table.compiled([archetypes[name] for name in names],
+                                      cum_weights)
+        return gen.biomes(
+            (gen.Biome(name, biome['moisture'], biome['elevation'],
+                       table(biome['table']), table(biome['clusters']))
+             for name, biome in self.biomes.items()), seed)
+
+    def recipe_book(self, archetypes):
+        '''Return a `nomad.crafting.RecipeBook` of the recipes, given the
+        archetypes by name.
+        '''
+        return RecipeBook(
+            Recipe(recipe['name'], recipe['ingredients'],
+                   archetypes[recipe['makes']], recipe['min_intelligence'])
+            for recipe in self.recipes)
+
+
+def compile_content(data, digest=None):
+    '''Compile content parsed from JSON into `Content`.
+
+    Raise ValueError if the content refers to a kind, role or color that
+    isn't declared, or binds a key curses doesn't know of or a command
+    that doesn't exist. Keys are named by their character, or by the
+    name of their curses constant, such as ``KEY_LEFT``.
+    '''
+    declared = data['kinds']
+    kind_names = tuple(declared)
+    glyphs = []
+    colors = array('B')
+    kinds = {}
+    for name, kind in declared.items():
+        char, color = kind['glyph']
+        if color not in COLOR_PAIRS:
+            raise ValueError('kind {!r} has unknown color {!r}'.format(
+                             name, color))
+        glyphs.append(char)
+        colors.append(COLOR_PAIRS[color])
+        if not kind.get('archetype', True):
+            continue
+        kind_roles = kind.get('roles', {})
+        for role_name in kind_roles:
+            if role_name not in ROLE_CLASSES:
+                raise ValueError('kind {!r} has unknown role {!r}'.format(
+                                 name, role_name))
+        kinds[name] = dict(walkable=kind['walkable'],
+                           moveable=kind.get('moveable', True),
+                           shared=kind.get('shared', False),
+                           roles=kind_roles)
+
+    def check_kind(name, where):
+        if name not in kinds:
+            raise ValueError('{} names unknown kind {!r}'.format(where, name))
+        return name
+
+    def compile_table(table, where):
+        probs = sorted((int(prob), check_kind(name, where))
+                       for prob, name in table.items())
+        return (tuple(name for _, name in probs),
+                tuple(min(prob, 100) for prob, _ in probs))
+
+    generator_kinds, cum_weights = compile_table(data.get('generator', {}),
+                                                 'generator')
+    biomes = {}
+    for name, biome in data.get('biomes', {}).items():
+        where = 'biome {!r}'.format(name)
+        clusters = biome.get('clusters')
+        biomes[name] = dict(
+            moisture=biome['moisture'], elevation=biome['elevation'],
+            table=compile_table(biome['table'], where),
+            clusters=None if clusters is None else compile_table(clusters,
+                                                                 where))
+    recipes = []
+    for recipe in data.get('recipes', ()):
+        where = 'recipe {!r}'.format(recipe['name'])
+        for name in recipe['ingredients']:
+            check_kind(name, where)
+        check_kind(recipe['makes'], where)
+        recipes.append(dict(name=recipe['name'],
+                            ingredients=tuple(recipe['ingredients']),
+                            makes=recipe['makes'],
+                            min_intelligence=recipe.get('min_intelligence',
+                                                        0)))
+    keys = dict(data.get('keys', {}))
+    commands = named_commands()
+    for key, name in keys.items():
+        if len(key) != 1 and not (key.startswith('KEY_') and
+                                  hasattr(curses, key)):
+            raise ValueError('unknown key {!r}'.format(key))
+        if name not in commands:
+            raise ValueError('key {!r} is bound to unknown command {!r}'
+                             .format(key, name))
+
+    return Content(digest, kind_names, ''.join(glyphs), colors, kinds,
+                   generator_kinds, cum_weights, biomes, tuple(recipes),
+                   keys)
+
+
+def load(path=DEFAULT_PATH, cache_dir=CACHE_DIR):
+    '''Load and compile the content file at `path`.
+
+    The compiled content is cached in `cache_dir`, keyed by a hash of the
+    file, and taken from there when the file hasn't changed. If
+    `cache_dir` is None, or can't be written to, nothing is cached.
+    '''
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, 'content-{}-{}.pickle'.format(
+                                  VERSION, digest))
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    content = compile_content(json.loads(raw.decode('utf-8')), digest)
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file first, so that a reader never
+            # sees half a cache.
+            tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(content, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return content
+
+
+@lru_cache(maxsize=None)
+def default():
+    '''Return the game's own content, loaded once.'''
+    return load()
@@ -0,0 +1,111 @@
+'''recipes for making things out of other things
+
+A `RecipeBook` compiles its recipes into an index keyed by the set of
+ingredient names each one needs, so finding what can be made from a
+pile of items only looks at the recipes whose ingredients are all in the
+pile, and never at the rest. What it finds is cached for each pile.
+'''
+from collections import Counter
+from itertools import combinations
+
+#: Most piles whose best recipe a `RecipeBook` remembers.
+CACHE_SIZE = 1024
+
+
+class Recipe:
+    '''A way to make an entity out of others.
+
+    :Parameters:
+        `name` : str
+            The name of the recipe.
+        `ingredients` : iterable or mapping
+            The names of the entities used up, repeated as many times as
+            each is needed, or a mapping of names to counts.
+        `make` : callable
+            Returns the entity made.
+        `min_intelligence` : number
+            The least intelligence needed to follow the recipe.
+    '''
+
+    __slots__ = ('name', 'ingredients', 'make', 'min_intelligence', 'size')
+
+    def __init__(self, name, ingredients, make, min_intelligence=0):
+        self.name = name
+        self.ingredients = Counter(ingredients)
+        self.make = make
+        self.min_intelligence = min_intelligence
+        self.size = sum(self.ingredients.values())
+
+    def __repr__(self):
+        return 'Recipe({!r})'.format(self.name)
+
+    def can_make(self, counts):
+        '''Do the counts of items by name hold every ingredient?'''
+        return all(counts[name] >= n for name, n in self.ingredients.items())
+
+
+class RecipeBook:
+    '''A compiled collection of recipes.
+
+    The best recipe for a pile of items is the one that uses the most
+    of them, or if several tie, the one given first.
+    '''
+
+    def __init__(self, recipes):
+        self.recipes = tuple(recipes)
+        #: Every name any recipe needs.
+        self.ingredient_names = frozenset(
+            name for recipe in self.recipes for name in recipe.ingredients)
+        # Recipes by the set of ingredient names they need, best first.
+        self.index = {}
+        for recipe in sorted(self.recipes, key=lambda r: -r.size):
+            self.index.setdefault(frozenset(recipe.ingredients),
+                                  []).append(recipe)
+        self.max_kinds = max((len(key) for key in self.index), default=0)
+        self._cache = {}
+
+    def __getstate__(self):
+        '''Pickle the book without its cache.'''
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def best(self, names, intelligence=float('inf')):
+        '''Return the best recipe that can be made from items with the
+        given names by someone of the given intelligence, or None.
+        '''
+        counts = Counter(name for name in names
+                         if name in self.ingredient_names)
+        key = (tuple(sorted(counts.items())), intelligence)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        recipe = self._cache[key] = self._resolve(counts, intelligence)
+        return recipe
+
+    def _resolve(self, counts, intelligence):
+        best = None
+        order = self.recipes.index
+        kinds = sorted(counts)
+        for k in range(1, min(len(kinds), self.max_kinds) + 1):
+            for names in combinations(kinds, k):
+                for recipe in self.index.get(frozenset(names), ()):
+                    if (recipe.min_intelligence > intelligence or
+                            not recipe.can_make(counts)):
+                        continue
+                    if (best is None or recipe.size > best.size or
+                            (recipe.size == best.size and
+                             order(recipe) < order(best))):
+                        best = recipe
+                    # The rest of this list are no bigger.
+                    break
+        return best
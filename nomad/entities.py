@@ -1,46 +1,61 @@
 '''entity definitions'''
-import random
-
-from nomad.entity import Entity
-from nomad.roles import *
+from nomad.content import default as default_content
 from nomad.util import DIRECTIONS
 
+#: How many steps from the nomad a yak lets it come before fleeing.
+WARY_DISTANCE = 3
+
 def shuffle(actor, nomad):
-    dx, dy = random.choice(DIRECTIONS)
+    dx, dy = actor.plains.rng.choice(DIRECTIONS)
     actor.move(dx, dy)
 
+def hunt(actor, nomad):
+    step = actor.plains.paths.towards(nomad.x, nomad.y).step(actor.x, actor.y)
+    if step is not None:
+        actor.move(*step)
+
+def flee(actor, nomad):
+    step = actor.plains.paths.away(nomad.x, nomad.y).step(actor.x, actor.y)
+    if step is not None:
+        actor.move(*step)
+
+def graze(actor, nomad):
+    '''Shuffle about, but flee the nomad if it comes too near.'''
+    # No walk is shorter than the distance in king's moves, so the flow
+    # field is only wanted when the nomad is that near.
+    if max(abs(actor.x - nomad.x), abs(actor.y - nomad.y)) > WARY_DISTANCE:
+        shuffle(actor, nomad)
+        return
+    cost = actor.plains.paths.towards(nomad.x, nomad.y).cost(actor.x, actor.y)
+    if cost is not None and cost <= WARY_DISTANCE:
+        flee(actor, nomad)
+    else:
+        shuffle(actor, nomad)
+
 def strike(tool, actor, target):
+    '''Hit the target with the tool, as hard as the tool is heavy.'''
     target.damage(tool.as_matter.weight)
 
 
-def earth(): return Entity(
-    'earth', True, False)
-def rock(): return Entity(
-    'rock', False)
-
-def grass(): return Entity(
-    'grass', True, roles={
-        'edible': Edible(0, -5)})
-def flower(): return Entity(
-    'flower', True, roles={
-        'edible': Edible(0, -1)}) 
-def mushroom(): return Entity(
-    'mushroom', True, roles={
-        'edible': Edible(10, 1)})
-
-def stick(): return Entity(
-    'stick', True, roles={
-        'matter': Matter(25, 25),
-        'usable': Usable(strike)})
-def sharp_rock(): return Entity(
-    'sharp rock', True, roles={
-        'matter': Matter(25, 25),
-        'usable': Usable(strike)})
-def spear(): return Entity(
-    'spear', True, roles={
-        'matter': Matter(25, 25),
-        'usable': Usable(strike)})
-
-def yak(): return Entity(
-    'yak', False, False, roles={
-        'actor': Actor(shuffle)})
+#: The functions roles may be declared with in the content file, by name.
+actions = {
+    'shuffle': shuffle,
+    'hunt': hunt,
+    'flee': flee,
+    'graze': graze,
+    'strike': strike,
+    }
+
+#: Archetypes by entity name, as declared in the content file (see
+#: `nomad.content`).
+kinds = default_content().archetypes(actions)
+
+earth = kinds['earth']
+rock = kinds['rock']
+grass = kinds['grass']
+flower = kinds['flower']
+mushroom = kinds['mushroom']
+stick = kinds['stick']
+sharp_rock = kinds['sharp rock']
+spear = kinds['spear']
+yak = kinds['yak']
@@ -2,11 +2,36 @@
 from collections import OrderedDict, namedtuple
 from itertools import chain
 
-from nomad import interface
+from nomad.events import Damaged
+from nomad.telemetry import stats as telemetry
 from nomad.util import DIRECTIONS
 
+#: Names of the roles an entity may take on, each held in an ``as_<name>``
+#: slot.
+ROLE_NAMES = ('matter', 'edible', 'usable', 'weapon', 'actor', 'reactor',
+              'mortal', 'tactile')
+
+
+#: Shared prototypes by name (see `Archetype`).
+prototypes = {}
+
+def prototype(name):
+    '''Return the shared prototype with the given name.'''
+    return prototypes[name]
+
+
+#: Archetypes by name.
+archetypes = {}
+
+def archetype(name):
+    '''Return the archetype with the given name.'''
+    return archetypes[name]
+
+
 class Stats:
 
+    __slots__ = ('strength', 'agility', 'intelligence')
+
     def __init__(self, strength, agility, intelligence):
         self.strength = strength
         self.agility = agility
@@ -14,41 +39,116 @@ class Stats:
 
 
 class Entity:
-    '''A thing that exists in the plains.'''
+    '''A thing that exists in the plains.
+
+    Each role is held in its own ``as_<name>`` slot (see `ROLE_NAMES`),
+    which is None if the entity lacks that role. ``roles`` holds every
+    role the entity has, in the order given.
+    '''
+
+    __slots__ = ('name', 'walkable', 'moveable', 'stats', 'roles',
+                 'held_entities', 'wx', 'wy', 'cell', 'plains',
+                 'shared', 'factory') + tuple('as_' + name
+                                              for name in ROLE_NAMES)
 
-    def __init__(self, name, walkable, moveable=True,
-                 stats=Stats(strength=1.0, agility=1.0, intelligence=1.0),
-                 roles={}):
+    def __init__(self, name, walkable, moveable=True, stats=None,
+                 roles=None):
+        telemetry.count('allocated')
         self.name = name
         self.walkable = walkable
         self.moveable = moveable
+        if stats is None:
+            stats = Stats(strength=1.0, agility=1.0, intelligence=1.0)
         self.stats = stats
 
-        self.roles = roles
-        for role in self.roles.values():
-            role.assign(self)
+        # Is this a prototype shared by many cells? (see `Archetype`)
+        self.shared = False
+        self.factory = None
+
+        self.as_matter = None
+        self.as_edible = None
+        self.as_usable = None
+        self.as_weapon = None
+        self.as_actor = None
+        self.as_reactor = None
+        self.as_mortal = None
+        self.as_tactile = None
+
+        if roles is None:
+            roles = {}
+        self.roles = tuple(roles.values())
+        for role_name, role in roles.items():
+            setattr(self, 'as_' + role_name, role)
+            if not role.shared:
+                role.assign(self)
 
         self.held_entities = []
 
-        self.x = None
-        self.y = None
-        self.z = None
+        self.wx = None
+        self.wy = None
+        self.cell = None
         self.plains = None
 
     def __str__(self):
         '''Return the entity's name.'''
         return self.name
 
+    def __reduce_ex__(self, protocol):
+        '''Pickle shared prototypes by name, so they stay shared.'''
+        if self.shared:
+            return prototype, (self.name,)
+        return super().__reduce_ex__(protocol)
+
+    def __getstate__(self):
+        '''Pickle every slot but ``plains`` and ``cell``, which are set
+        again when the entity is put back on a plains.
+        '''
+        state = dict((slot, getattr(self, slot))
+                     for cls in type(self).__mro__
+                     for slot in cls.__dict__.get('__slots__', ())
+                     if hasattr(self, slot))
+        state['plains'] = None
+        state['cell'] = None
+        return None, state
+
     def get_role(self, role_name):
-        return self.roles.get(role_name, None)
+        return getattr(self, 'as_' + role_name, None)
+
+    def claim_role(self, role_name):
+        '''Return the role with the given name, first replacing it with a
+        copy of the entity's own if it is shared.
+
+        Use this rather than ``as_<name>`` to get a role that may be
+        changed.
+        '''
+        role = self.get_role(role_name)
+        if role is None or role.entity is self:
+            return role
+        own = role.clone()
+        self.roles = tuple(own if r is role else r for r in self.roles)
+        setattr(self, 'as_' + role_name, own)
+        own.assign(self)
+        return own
+
+    def _get_x(self):
+        return self.wx - self.plains.origin.x
+    def _set_x(self, x):
+        self.wx = x + self.plains.origin.x
+    x = property(_get_x, _set_x, doc=
+        '''X position relative to the plains' origin.''')
+
+    def _get_y(self):
+        return self.wy - self.plains.origin.y
+    def _set_y(self, y):
+        self.wy = y + self.plains.origin.y
+    y = property(_get_y, _set_y, doc=
+        '''Y position relative to the plains' origin.''')
 
-    as_matter = property(lambda self: self.get_role('matter'))
-    as_edible = property(lambda self: self.get_role('edible'))
-    as_usable = property(lambda self: self.get_role('usable'))
-    as_actor = property(lambda self: self.get_role('actor'))
-    as_reactor = property(lambda self: self.get_role('reactor'))
-    as_mortal = property(lambda self: self.get_role('mortal'))
-    as_tactile = property(lambda self: self.get_role('tactile'))
+    def _get_z(self):
+        return self.cell.index(self)
+    z = property(_get_z, doc=
+        '''Height in the entity's cell, counted from the bottom. Derived
+        from the cell on demand, so that stacking never renumbers it.''')
 
     def _get_pos(self):
         return self.x, self.y
@@ -58,7 +158,24 @@ class Entity:
         '''Swizzle for (x, y).''')
 
     def select_in_reach(self):
-        return interface.ui.select_adjacent_entity()
+        '''Choose an entity in reach. Return None if there is no way to
+        choose one.
+        '''
+        return None
+
+    def reach(self, dx, dy):
+        '''Return the entity in reach in the given direction, or None.
+
+        (0, 0) reaches the entity underfoot; any other direction reaches
+        the adjacent entity only if it can't be walked over.
+        '''
+        if (dx, dy) == (0, 0):
+            x, y, z = self.x, self.y, self.z - 1
+        else:
+            x, y, z = self.x + dx, self.y + dy, -1
+            if self.plains.get_entity(x, y, z).walkable:
+                return None
+        return self.plains.claim_entity(x, y, z)
     
     def get_in_reach(self):
         in_reach = []
@@ -90,9 +207,8 @@ class Entity:
         A `Role` may provide behavior for this method by overriding
         `Role.update`.
         '''
-        for role in self.roles.values():
-            if role:
-                role.update(nomad)
+        for role in self.roles:
+            role.update(nomad)
 
     def put_underfoot(self, entity):
         '''Place an entity just under this one.'''
@@ -101,10 +217,17 @@ class Entity:
         self.plains.add_entity(entity, self.x, self.y, self.z)
 
     def damage(self, dmg):
+        '''Deal damage to each role that can take it. Return True if any
+        did.
+        '''
         damaged = False
-        for role in self.roles.values():
-            if role:
-                damaged = role.damage(dmg) or damaged
+        for role in self.roles:
+            damaged = role.damage(dmg) or damaged
+        if damaged and self.plains is not None:
+            bus = self.plains.events
+            if bus.wants(Damaged):
+                bus.post(Damaged(self, dmg))
+        return damaged
     
     def wait(self):
         '''Do nothing.'''
@@ -112,9 +235,84 @@ class Entity:
 
     def move(self, dx, dy):
         '''Move the entity in the given direction.'''
-        assert None not in (self.x, self.y, self.plains)
+        assert None not in (self.wx, self.wy, self.plains)
         x = self.x + dx
         y = self.y + dy
         if not self.plains.walkable_at(x, y):
             return
         self.plains.move_entity(self, x, y) 
+
+
+class Archetype:
+    '''A kind of entity, declared once, which makes entities of its kind
+    when called.
+
+    :Parameters:
+        `name` : str
+            The name of the entities made.
+        `walkable`, `moveable` : bool
+            As for `Entity`.
+        `stats` : `Stats`
+            The stats of every entity of the kind, shared read-only. By
+            default, ones and all.
+        `roles` : dict
+            Role templates by role name. Stateless roles, such as `Edible`
+            and `Matter`, are shared read-only by every entity of the kind
+            (see `Entity.claim_role`); the rest are copied for each entity.
+        `shared` : bool
+            If true, every call returns a single prototype instead of a
+            new entity. Prototypes suit stateless terrain: every cell of a
+            kind holds the same object, which has no position of its own.
+            The plains promotes a prototype to an entity made by `new` as
+            soon as something may change it (see `Plains.claim_entity`).
+
+    Archetypes are registered by name, and pickled by it.
+    '''
+
+    __slots__ = ('name', 'walkable', 'moveable', 'stats', 'roles',
+                 'prototype', '_copies')
+
+    def __init__(self, name, walkable, moveable=True, stats=None,
+                 roles=None, shared=False):
+        self.name = name
+        self.walkable = walkable
+        self.moveable = moveable
+        if stats is None:
+            stats = Stats(strength=1.0, agility=1.0, intelligence=1.0)
+        self.stats = stats
+        self.roles = dict(roles or {})
+        self.prototype = None
+        # The roles cloned for each entity, by name.
+        self._copies = [(role_name, role)
+                        for role_name, role in self.roles.items()
+                        if not role.shared]
+        archetypes[name] = self
+        if shared:
+            self.prototype = prototype = self.new()
+            prototype.shared = True
+            prototype.factory = self.new
+            prototypes[name] = prototype
+
+    def __repr__(self):
+        return 'Archetype({!r})'.format(self.name)
+
+    def __reduce__(self):
+        return archetype, (self.name,)
+
+    def __call__(self):
+        '''Return the prototype if the archetype is shared, else a new
+        entity.
+        '''
+        if self.prototype is not None:
+            return self.prototype
+        return self.new()
+
+    def new(self):
+        '''Return a new entity of the kind.'''
+        roles = self.roles
+        if self._copies:
+            roles = roles.copy()
+            for role_name, role in self._copies:
+                roles[role_name] = role.clone()
+        return Entity(self.name, self.walkable, self.moveable, self.stats,
+                      roles)
@@ -0,0 +1,180 @@
+'''things that happen on the plains, and who hears of them
+
+Something that happens is posted to the plains' `EventBus` as an `Event`
+of a particular type. Handlers subscribe to a type of event, either about
+any entity or about one entity in particular, and are only called when
+such an event happens: nothing is polled. Events posted during a turn are
+held until the end of the turn and then handed out in the order they
+happened, and events of a type nobody subscribes to are never held at
+all, so that entities nobody is listening to cost nothing.
+'''
+from nomad.telemetry import stats as telemetry
+
+
+class Event:
+    '''Something that happened to an entity.'''
+
+    __slots__ = ('entity',)
+
+    def __init__(self, entity):
+        self.entity = entity
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            repr(getattr(self, slot)) for slot in self._fields()))
+
+    @classmethod
+    def _fields(cls):
+        return tuple(slot for c in reversed(cls.__mro__)
+                     for slot in c.__dict__.get('__slots__', ()))
+
+    def subjects(self):
+        '''Return the entities the event is about, to whose subscribers
+        it is handed.
+        '''
+        return (self.entity,)
+
+
+class Moved(Event):
+    '''An entity moved from world point ``source`` to ``dest``.'''
+
+    __slots__ = ('source', 'dest')
+
+    def __init__(self, entity, source, dest):
+        super().__init__(entity)
+        self.source = source
+        self.dest = dest
+
+
+class Damaged(Event):
+    '''An entity took ``amount`` damage.'''
+
+    __slots__ = ('amount',)
+
+    def __init__(self, entity, amount):
+        super().__init__(entity)
+        self.amount = amount
+
+
+class Ate(Event):
+    '''An entity ate ``food``.'''
+
+    __slots__ = ('food',)
+
+    def __init__(self, entity, food):
+        super().__init__(entity)
+        self.food = food
+
+    def subjects(self):
+        return (self.entity, self.food)
+
+
+class PickedUp(Event):
+    '''An entity picked up ``item``.'''
+
+    __slots__ = ('item',)
+
+    def __init__(self, entity, item):
+        super().__init__(entity)
+        self.item = item
+
+    def subjects(self):
+        return (self.entity, self.item)
+
+
+class ShiftedOut(Event):
+    '''An entity left the plains as it shifted.'''
+
+    __slots__ = ()
+
+
+class EventBus:
+    '''Hands out events to the handlers subscribed to them.
+
+    A handler is called with each event of its type, in the order the
+    events were posted, and at most once per event however many of its
+    subjects it is subscribed to. Subscriptions about an entity are
+    dropped when it leaves the plains, however it leaves; a reactor is
+    subscribed again whenever its entity is put back.
+    '''
+
+    def __init__(self):
+        # Handlers by event type, and by event type and entity, each
+        # held in a dict used as an ordered set.
+        self._by_type = {}
+        self._by_entity = {}
+        # The event types subscribed to with the number of subscriptions
+        # to each, and the types subscribed to about each entity.
+        self._counts = {}
+        self._entity_types = {}
+        self.pending = []
+
+    def subscribe(self, event_type, handler, entity=None):
+        '''Call `handler` with each event of `event_type`, or if `entity`
+        is given, with each such event about it.
+        '''
+        if entity is None:
+            handlers = self._by_type.setdefault(event_type, {})
+        else:
+            handlers = self._by_entity.setdefault((event_type, entity), {})
+            self._entity_types.setdefault(entity, set()).add(event_type)
+        if handler not in handlers:
+            handlers[handler] = None
+            self._counts[event_type] = self._counts.get(event_type, 0) + 1
+
+    def unsubscribe(self, event_type, handler, entity=None):
+        '''Undo a call to `subscribe`.'''
+        if entity is None:
+            handlers = self._by_type.get(event_type, {})
+        else:
+            handlers = self._by_entity.get((event_type, entity), {})
+        if handlers.pop(handler, 0) is None:
+            self._uncount(event_type, 1)
+
+    def forget(self, entity):
+        '''Drop every subscription about the entity.'''
+        for event_type in self._entity_types.pop(entity, ()):
+            handlers = self._by_entity.pop((event_type, entity))
+            self._uncount(event_type, len(handlers))
+
+    def _uncount(self, event_type, n):
+        count = self._counts[event_type] - n
+        if count:
+            self._counts[event_type] = count
+        else:
+            del self._counts[event_type]
+
+    def wants(self, event_type):
+        '''Does anything subscribe to events of the type?'''
+        return event_type in self._counts
+
+    def post(self, event):
+        '''Hold the event to be handed out by `flush`, if anything
+        subscribes to its type.
+        '''
+        if type(event) in self._counts:
+            self.pending.append(event)
+
+    def publish(self, event):
+        '''Hand out the event at once.'''
+        event_type = type(event)
+        if event_type not in self._counts:
+            return
+        handlers = dict(self._by_type.get(event_type, ()))
+        for entity in event.subjects():
+            handlers.update(self._by_entity.get((event_type, entity), ()))
+        for handler in handlers:
+            handler(event)
+        telemetry.count('events')
+
+    def flush(self):
+        '''Hand out the events posted so far, including any posted while
+        they are handed out. Return the number handed out.
+        '''
+        n = 0
+        while self.pending:
+            pending, self.pending = self.pending, []
+            for event in pending:
+                self.publish(event)
+            n += len(pending)
+        return n
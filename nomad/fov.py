@@ -0,0 +1,242 @@
+'''what can be seen from where, by recursive shadowcasting
+
+Anything that can't be walked over blocks sight, save the viewer itself.
+The plains keeps the world coordinates of its blocking cells up to date
+as entities come and go (see `Plains.blockers`), so a field of view
+needn't look at every cell to know what blocks it.
+
+A field of view is cast as eight octants, and each octant is cached by
+the layout of the blockers within it, relative to the viewer. While
+neither the viewer nor any blocker moves, the last field of view is
+reused whole; when a yak moves, only the octants whose blockers moved
+are cast again.
+'''
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+#: Most layouts remembered for each octant.
+CACHE_SIZE = 256
+
+# The transforms from an octant's own (dx, dy) coordinates, in which it
+# spans dy < 0 and dy <= dx <= 0, to coordinates around the viewer, as
+# (xx, xy, yx, yy).
+OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+
+def in_octant(octant, x, y):
+    '''Is (x, y), around the viewer, in the given octant? Points on the
+    line between two octants are in both.
+    '''
+    xx, xy, yx, yy = octant
+    # The transforms are orthogonal, so each is undone by its transpose.
+    dx = x * xx + y * yx
+    dy = x * xy + y * yy
+    return dy < 0 and dy <= dx <= 0
+
+
+@lru_cache(maxsize=8)
+def octants_of(radius):
+    '''Return a dict mapping each point around the viewer within
+    `radius`, but the viewer's own, to the indices of the octants it is
+    in.
+    '''
+    return dict(((x, y), tuple(n for n, octant in enumerate(OCTANTS)
+                               if in_octant(octant, x, y)))
+                for x in range(-radius, radius + 1)
+                for y in range(-radius, radius + 1)
+                if x or y)
+
+
+@lru_cache(maxsize=8)
+def octant_rows(radius):
+    '''Return the cells of each octant within `radius`, for casting.
+
+    For each octant, row ``j`` (the cells with ``dy == -j``, in order of
+    ``dx``) is given as a tuple of lists: the negated right and left
+    slopes of its cells, which ascend and so can be bisected, their left
+    and right slopes, and their points around the viewer.
+    '''
+    octants = []
+    for xx, xy, yx, yy in OCTANTS:
+        rows = [None]
+        for j in range(1, radius + 1):
+            dy = -j
+            dxs = range(-j, 1)
+            lefts = [(dx - 0.5) / (dy + 0.5) for dx in dxs]
+            rights = [(dx + 0.5) / (dy - 0.5) for dx in dxs]
+            points = [(dx * xx + dy * xy, dx * yx + dy * yy) for dx in dxs]
+            rows.append(([-r for r in rights], [-l for l in lefts],
+                         lefts, rights, points))
+        octants.append(rows)
+    return octants
+
+
+def cast_octant(n, blockers, radius):
+    '''Return the points around the viewer visible in octant `n`, given
+    the set of blocking points in it.
+
+    Each row is lit a slice at a time, and only its blockers are looked
+    at one by one.
+    '''
+    if not blockers:
+        return full_octant(n, radius)
+    xx, xy, yx, yy = OCTANTS[n]
+    rows = octant_rows(radius)[n]
+    # The blockers in each row, by their index in the row.
+    row_blockers = {}
+    for x, y in blockers:
+        dx = x * xx + y * yx
+        dy = x * xy + y * yy
+        row_blockers.setdefault(-dy, []).append(dx - dy)
+    for indices in row_blockers.values():
+        indices.sort()
+    visible = set()
+    update = visible.update
+
+    def cast(row, start, end):
+        # Light rows outwards from `row`, between the slopes `start` and
+        # `end`, recursing into the light left beside each run of
+        # blockers.
+        if start < end:
+            return
+        for j in range(row, radius + 1):
+            neg_rights, neg_lefts, lefts, rights, points = rows[j]
+            first = bisect_left(neg_rights, -start)
+            stop = bisect_right(neg_lefts, -end)
+            if first >= stop:
+                continue
+            update(points[first:stop])
+            indices = row_blockers.get(j)
+            if not indices or j == radius:
+                continue
+
+            blocked = False
+            last = None
+            for i in indices[bisect_left(indices, first):
+                             bisect_left(indices, stop)]:
+                if blocked and i == last + 1:
+                    new_start = rights[i]
+                else:
+                    if blocked:
+                        # The run of blockers ended in clear cells.
+                        start = new_start
+                    cast(j + 1, start, lefts[i])
+                    new_start = rights[i]
+                    blocked = True
+                last = i
+            if blocked:
+                if last == stop - 1:
+                    # The row ends in shadow.
+                    return
+                start = new_start
+
+    cast(1, 1.0, 0.0)
+    return frozenset(visible)
+
+
+@lru_cache(maxsize=64)
+def full_octant(n, radius):
+    '''Return every point in octant `n` within `radius`.'''
+    return frozenset(point for row in octant_rows(radius)[n][1:]
+                     for point in row[-1])
+
+
+def line_of_sight(blocked, x1, y1, x2, y2):
+    '''Is there a straight line from (x1, y1) to (x2, y2) that no point
+    for which `blocked(x, y)` is true crosses? The ends don't count.
+
+    This is cheaper than a field of view for a single pair of points,
+    but may disagree with one at the edges of shadows.
+    '''
+    dx, dy = x2 - x1, y2 - y1
+    steps = max(abs(dx), abs(dy))
+    for i in range(1, steps):
+        x = x1 + round(dx * i / steps)
+        y = y1 + round(dy * i / steps)
+        if blocked(x, y):
+            return False
+    return True
+
+
+class FieldOfView:
+    '''The field of view of a viewer on a `Plains`.
+
+    `radius` is how far the viewer sees in a straight line along either
+    axis; by default, to the edge of the plains.
+    '''
+
+    def __init__(self, plains, radius=None):
+        self.plains = plains
+        if radius is None:
+            entities = plains.entities
+            radius = max(entities.width, entities.height) // 2
+        self.radius = radius
+        # Visible points by blocker layout, for each octant.
+        self._cache = [{} for _ in OCTANTS]
+        # The viewer and blockers of the last field of view, in world
+        # coordinates, its octants, and their union.
+        self._last = (None, None, None)
+
+    def blockers_around(self, x, y):
+        '''Return the blocking points within the radius, relative to
+        (x, y), leaving out (x, y) itself.
+        '''
+        ox, oy = self.plains.origin
+        wx, wy = x + ox, y + oy
+        radius = self.radius
+        around = []
+        for bx, by in self.plains.blockers:
+            rx, ry = bx - wx, by - wy
+            if ((rx or ry) and -radius <= rx <= radius and
+                    -radius <= ry <= radius):
+                around.append((rx, ry))
+        return around
+
+    def visible(self, x=0, y=0):
+        '''Return the set of points visible from (x, y), relative to
+        (x, y). The viewer's own point is always visible.
+        '''
+        ox, oy = self.plains.origin
+        layout = ((x + ox, y + oy), frozenset(self.plains.blockers))
+        last_layout, last_parts, last_union = self._last
+        if layout == last_layout:
+            return last_union
+
+        # Sort the blockers into octants.
+        in_octants = [[] for _ in OCTANTS]
+        octants = octants_of(self.radius)
+        for b in self.blockers_around(x, y):
+            for n in octants[b]:
+                in_octants[n].append(b)
+
+        parts = []
+        for n, (blockers, cache) in enumerate(zip(in_octants, self._cache)):
+            key = frozenset(blockers)
+            part = cache.get(key)
+            if part is None:
+                if len(cache) >= CACHE_SIZE:
+                    cache.clear()
+                part = cache[key] = cast_octant(n, key, self.radius)
+            parts.append(part)
+
+        if last_parts is not None and all(
+                a is b for a, b in zip(parts, last_parts)):
+            union = last_union
+        else:
+            union = frozenset().union(*parts) | {(0, 0)}
+        self._last = (layout, parts, union)
+        return union
+
+    def is_visible(self, x, y):
+        '''Can the point (x, y) be seen from the center of the plains?'''
+        return (x, y) in self.visible()
+
+    def line_of_sight(self, x1, y1, x2, y2):
+        '''Is there a clear line of sight between two points on the
+        plains? See `line_of_sight`.
+        '''
+        ox, oy = self.plains.origin
+        blockers = self.plains.blockers
+        return line_of_sight(lambda x, y: (x + ox, y + oy) in blockers,
+                             x1, y1, x2, y2)
@@ -1,14 +1,17 @@
 '''run the game'''
+from concurrent.futures import ThreadPoolExecutor
 import curses
-from curses import KEY_LEFT, KEY_RIGHT, KEY_UP, KEY_DOWN
 from functools import partial
+import random
 
-from nomad.entities import *
+from nomad.commands import *
+from nomad.content import default as default_content
 from nomad import interface
 from nomad.interface import *
-from nomad.nomad import Nomad
-from nomad.plains import Plains
-import nomad.plainsgen as gen
+from nomad.loop import TICK, GameLoop
+from nomad.replay import Recording
+from nomad.simulation import new_world
+from nomad.telemetry import stats as telemetry
 from nomad.util import *
 
 # Subwindow dimensions as (height, width, y, x)
@@ -16,37 +19,37 @@ PLAINS_WIN = (21, 21, 1, 1)
 STATUS_WIN = (21, 21, 0, 22)
 
 
-def run():
+def run(stats_path=None, tick=TICK, seed=None, record_path=None):
     '''Initialize curses and call `main`.'''
     stdscr = curses.initscr()
     curses.start_color()
     curses.use_default_colors()
     curses.curs_set(0)
-    curses.wrapper(main)
+    curses.wrapper(main, stats_path, tick, seed, record_path)
     curses.curs_set(1)
 
 
-def main(stdscr): 
-    '''Run the game, given a curses ``stdscr``.'''
+def main(stdscr, stats_path=None, tick=TICK, seed=None, record_path=None):
+    '''Run the game, given a curses ``stdscr``.
+
+    If `stats_path` is given, `nomad.telemetry` stats are written to it
+    when the game ends. The world takes a turn every `tick` seconds, or
+    after each key if `tick` is None (see `nomad.loop.GameLoop`).
+
+    The world is generated from `seed`, or from a random seed if it is
+    None. If `record_path` is given, the game is recorded to it, to be
+    replayed with `nomad.replay`.
+    '''
     init_color_pairs()
 
-    # Define the nomad.
-    nomad = Nomad(los=6)
-    # Define the plains.
-    los = nomad.los
-    half_los = los // 2 + 1
-    plains = Plains.with_floor(earth,
-                               gen.chance(
-                                   {90: grass, 10: flower,
-                                    3: mushroom, 5: stick,
-                                    2: sharp_rock, 1: yak}),
-                               up=-los, left=-los, right=los, down=los,
-                               ul=Point(-half_los, -half_los),
-                               ur=Point(-half_los, half_los),
-                               lr=Point(half_los, half_los),
-                               ll=Point(half_los, -half_los),)
-    # Add nomad to plains.
-    plains.add_entity(nomad, 0, 0)
+    # Define the nomad and the plains.
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    nomad, plains = new_world(los=6, seed=seed)
+    recording = None
+    if record_path is not None:
+        recording = Recording(seed, nomad.los)
+        recording.checkpoint(nomad, plains)
 
     # Make windows.
     plains_win = curses.newwin(*PLAINS_WIN) 
@@ -57,30 +60,28 @@ def main(stdscr):
     command_dict = player_commands()
     # Initialize user interface.
     interface.ui = interface.Interface(stdscr, plains_win, status_win,
-                                       nomad, display_dict, command_dict)
-
-    # Execute the main loop while the nomad lives.
-    while nomad.as_mortal.alive:
-        # Update the screen.
-        interface.ui.update_plains_window()
-        interface.ui.update_status_window()
+                                       nomad, display_dict, command_dict,
+                                       recording)
+    nomad.ui = interface.ui
 
-        # Get and handle user input.
-        interface.ui.interact()
+    # Generate the plains ahead of the nomad while waiting on the player.
+    executor = ThreadPoolExecutor(max_workers=1)
 
-        # Update all entities.
-        update_entities(nomad, plains)
+    # Execute the main loop while the nomad lives.
+    try:
+        GameLoop(interface.ui, executor, tick).run()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if recording is not None:
+            recording.checkpoint(nomad, plains)
+            recording.save(record_path)
+    if stats_path is not None:
+        telemetry.dump(stats_path)
 
     # Game over.
     game_over(stdscr, nomad)
 
 
-def update_entities(nomad, plains):
-    '''Update each `Entity` in the `Plains` with the `Nomad`.'''
-    for entity in plains.get_entities():
-        entity.update(nomad)
-
-
 def game_over(stdscr, nomad):
     '''End the game.'''
     stdscr.clear()
@@ -91,42 +92,20 @@ def game_over(stdscr, nomad):
 
 
 def player_commands():
-    '''Return a dict mapping curses key values to functions that
-    should be called when those keys are pressed.
+    '''Return a dict mapping curses key values to the names of the
+    commands (see `nomad.commands.named_commands`) that should be
+    performed when those keys are pressed, as bound in the content file
+    (see `nomad.content`).
 
-    Each function should take a `Nomad` as its single argument.
+    Keys are named by their character, or by the name of their curses
+    constant, such as ``KEY_LEFT``.
     '''
-
-    def make_move_nomad(dx, dy):
-        def move_nomad(nomad):
-            nomad.move(dx, dy)
-        return move_nomad
-
-    # Assign movement keys (from `interface.key_to_dir`).
-    commands = dict((key, make_move_nomad(*d))
-                    for key, d in key_to_dir.items())
-
-    def eat_nearest(nomad):
-        nomad.as_tactile.eat_nearest()
-
-    def pickup_nearest(nomad):
-        nomad.as_tactile.pickup_nearest()
-
-    def drop_all(nomad):
-        nomad.as_tactile.drop_all()
-
-    def combine_objects(nomad):
-        nomad.as_tactile.combine_objects()
-
-    # Assign all other single-key actions.
-    commands.update({
-        ord('w'): Nomad.wait,
-        ord('e'): eat_nearest,
-        ord('g'): pickup_nearest,
-        ord('d'): drop_all,
-        ord('c'): combine_objects,
-        })
-
+    commands = {}
+    for key, name in default_content().keys.items():
+        if key.startswith('KEY_'):
+            commands[getattr(curses, key)] = name
+        else:
+            commands[ord(key)] = name
     return commands
 
 
@@ -136,18 +115,7 @@ def render_info():
     Each value is of the form (char, pair_num) where char is the
     character to render and pair_num is a curses color pair number 0-9.
     '''
-    return {
-        'nomad':        ('@', PAIR_YELLOW),
-        'grass':        ('"', PAIR_GREEN),
-        'flower':       ('*', PAIR_BLUE),
-        'earth':        ('.', PAIR_WHITE),
-        'rock':         ('0', PAIR_CYAN),
-        'yak':          ('Y', PAIR_RED),
-        'mushroom':     ('?', PAIR_MAGENTA),
-        'sharp rock':   ('>', PAIR_CYAN),
-        'stick':        ('/', PAIR_WHITE),
-        'spear':        ('|', PAIR_YELLOW),
-        }
+    return default_content().render_info()
 
 
 def init_color_pairs():
@@ -1,6 +1,6 @@
 import curses
-from curses import KEY_LEFT, KEY_RIGHT, KEY_UP, KEY_DOWN
 
+from nomad.commands import DIRECTION_NAMES, named_commands
 from nomad.util import *
 
 # curses color pair numbers (for `init_color_pairs` and `render_info`)
@@ -12,27 +12,25 @@ PAIR_MAGENTA = 5
 PAIR_CYAN = 6
 PAIR_WHITE = 7
 
+# The glyph of a cell out of sight.
+HIDDEN = (' ', 0)
+
 KEY_ENTER = ord(' ')
 KEY_YES = ord('y')
 KEY_NO = ord('n')
 
 ui = None
 
-key_to_dir = flatten_keys({
-    (ord('s'),): (0, 0),
-    (ord('h'), KEY_LEFT): DIR_LEFT,
-    (ord('j'), KEY_DOWN): DIR_DOWN,
-    (ord('k'), KEY_UP): DIR_UP,
-    (ord('l'), KEY_RIGHT): DIR_RIGHT,
-    (ord('y'),): DIR_UPLEFT,
-    (ord('u'),): DIR_UPRIGHT,
-    (ord('b'),): DIR_DOWNLEFT,
-    (ord('n'),): DIR_DOWNRIGHT,})
-
 class Interface:
+    '''The curses interface to a game.
+
+    `command_dict` maps curses key values to command names (see
+    `nomad.commands.named_commands`). If a `nomad.replay.Recording` is
+    given, every command and selection is recorded to it.
+    '''
 
     def __init__(self, stdscr, plains_win, status_win, nomad, display_dict,
-                 command_dict):
+                 command_dict, recording=None):
         self.stdscr = stdscr
         self.plains_win = plains_win
         self.status_win = status_win
@@ -40,45 +38,61 @@ class Interface:
         self.plains = nomad.plains
         self.display_dict = display_dict
         self.command_dict = command_dict
+        self.commands = named_commands()
+        # Directions by the keys bound to them, for selecting in reach.
+        self.key_to_dir = dict((key, DIRECTION_NAMES[name])
+                               for key, name in command_dict.items()
+                               if name in DIRECTION_NAMES)
+        self.recording = recording
+
+        # (char, curses attribute) pairs by entity name.
+        self.glyphs = dict(
+            (name, (char, curses.color_pair(color)))
+            for name, (char, color) in display_dict.items())
+        # The points of the plains in drawing order, and the glyph last
+        # drawn at each of them.
+        self.points = tuple(self.plains.entities)
+        self.frame = None
+        self.nodelay = False
 
     def select_adjacent_entity(self):
         '''Prompt the player to select an entity adjacent to the nomad.
 
         The player presses the corresponding movement key for the desired
-        direction. 's' selects the entity underfoot.
+        direction, or the key bound to 'here' (by default, 's') for the
+        entity underfoot.
         '''
         # Highlight nomad.
-        los = self.nomad.los
         x, y = self.nomad.pos
-        self.plains_win.chgat(y + los, x + los, 1, curses.A_REVERSE)
+        self.highlight(x, y)
 
         cmd = None
         dx = dy = 0
-        while True:
-            # Get keyboard input.
+        # Wait for keyboard input, even if reading keys doesn't block.
+        self.plains_win.nodelay(False)
+        try:
             while cmd != KEY_ENTER:
                 cmd = self.plains_win.getch()
-                if cmd not in key_to_dir:
+                if cmd not in self.key_to_dir:
                     continue
 
-                self.update_plains_window()
-                dx, dy = key_to_dir[cmd]
-                self.plains_win.chgat(y + los + dy, x + los + dx, 1,
-                                      curses.A_REVERSE)
-
-            if (dx, dy) == (0, 0):
-                return self.nomad.get_underfoot()
-            else:
-                adjacent = self.nomad.get_adjacent(dx, dy)
-                if not adjacent.walkable:
-                    return adjacent
-                else:
-                    return None
-
-                    
+                # Move the highlight, redrawing only the cell it leaves.
+                self.draw_cell(x + dx, y + dy)
+                dx, dy = self.key_to_dir[cmd]
+                self.highlight(x + dx, y + dy)
+        finally:
+            self.plains_win.nodelay(self.nodelay)
+
+        self.draw_cell(x + dx, y + dy)
+        if self.recording is not None:
+            self.recording.record((dx, dy))
+        return self.nomad.reach(dx, dy)
+
     def update_status_window(self):
         '''Draw some information about a `Nomad` on a window.'''
-        self.status_win.clear()
+        # Erase rather than clear, which would have curses repaint the
+        # whole terminal; `invalidate` asks for that when it's wanted.
+        self.status_win.erase()
         y = 1
         x = 2
         ystep = 1
@@ -102,33 +116,81 @@ class Interface:
         self.status_win.addstr(str(self.nomad.as_tactile.held_entities[1]))
 
         self.status_win.box()
-        self.status_win.refresh()
+        self.status_win.noutrefresh()
+
 
+    def render(self):
+        '''Draw every window, then update the screen in one go.'''
+        self.update_plains_window()
+        self.update_status_window()
+        curses.doupdate()
+
+    def invalidate(self):
+        '''Forget the last frame, so the next one is drawn in full and the
+        terminal repainted from scratch.
+        '''
+        self.frame = None
+        self.plains_win.clearok(True)
 
     def update_plains_window(self):
-        '''Draw a `Plains` on a window, given rendering information.'''
-        self.plains_win.clear()
-
-        coords = range(self.plains.entities.left,
-                       self.plains.entities.right + 1)
-        # For y, x in the boundary rectangle of the plains
-        for y in coords:
-            for x in coords:
-                # If xy is in the plains, draw the plains at that xy.
-                if (x, y) in self.plains.entities:
-                    entity = self.plains.get_entity(x, y, -1)
-                    char, color = self.display_dict[entity.name]
-                # Otherwise, draw an blank space.
-                else:
-                    char = ' '
-                    color = PAIR_WHITE
-                self.plains_win.addnstr(y + self.plains.entities.down,
-                                        x + self.plains.entities.right,
-                            char, 1, curses.color_pair(color))
-
-        self.plains_win.refresh()
+        '''Draw a `Plains` on a window, given rendering information.
+
+        Only the cells whose glyph changed since the last frame are drawn.
+        Cells out of the nomad's sight (see `nomad.fov`) are drawn blank.
+        '''
+        entities = self.plains.entities
+        cells = self.plains.cells
+        ox, oy = self.plains.origin
+        glyphs = self.glyphs
+        visible = self.plains.fov.visible()
+        frame = [glyphs[cells[(x + ox, y + oy)][-1].name]
+                 if (x, y) in visible else HIDDEN
+                 for x, y in self.points]
+
+        if self.frame is None:
+            # Draw everything, leaving the corners outside the plains blank.
+            self.plains_win.erase()
+            changed = zip(self.points, frame)
+        else:
+            changed = ((xy, glyph) for xy, glyph, last
+                       in zip(self.points, frame, self.frame)
+                       if glyph is not last)
+
+        for (x, y), (char, attr) in changed:
+            self.plains_win.addnstr(y + entities.down, x + entities.right,
+                                    char, 1, attr)
+        self.frame = frame
+        self.plains_win.noutrefresh()
+
+    def draw_cell(self, x, y):
+        '''Draw the top entity at (x, y) on the plains window.'''
+        entities = self.plains.entities
+        char, attr = self.glyphs[self.plains.get_entity(x, y).name]
+        self.plains_win.addnstr(y + entities.down, x + entities.right,
+                                char, 1, attr)
+
+    def highlight(self, x, y):
+        '''Highlight the cell at (x, y) on the plains window.'''
+        entities = self.plains.entities
+        self.plains_win.chgat(y + entities.down, x + entities.right, 1,
+                              curses.A_REVERSE)
+
+    def set_nodelay(self, flag):
+        '''Make reading a key return -1 at once, rather than wait, when no
+        key has been pressed.
+        '''
+        self.nodelay = flag
+        self.plains_win.nodelay(flag)
+
+    def handle_key(self, key):
+        '''Perform the command bound to a key, if any.'''
+        name = self.command_dict.get(key)
+        if name is None:
+            return
+        if self.recording is not None:
+            self.recording.record(name)
+        self.commands[name](self.nomad)
 
     def interact(self):
-        key = self.plains_win.getch()
-        if key in self.command_dict:
-            self.command_dict[key](self.nomad)
+        '''Wait for a key and perform its command.'''
+        self.handle_key(self.plains_win.getch())
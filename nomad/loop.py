@@ -0,0 +1,160 @@
+'''an asyncio game loop, in which the world keeps its own time
+
+Keys are handled as soon as they are typed, without blocking: the loop
+watches the terminal for input instead of waiting on ``getch``. Actors
+such as yaks take their turns on a clock of their own, and the screen is
+redrawn at most once per frame, however much changed in between.
+'''
+import asyncio
+
+from nomad.simulation import update_entities
+from nomad.telemetry import stats as telemetry
+
+#: Seconds between turns of the world.
+TICK = 0.5
+#: Most frames drawn per second.
+FRAME_RATE = 30
+
+
+class GameLoop:
+    '''Runs a game of Nomad on an asyncio event loop.
+
+    :Parameters:
+        `ui` : `Interface`
+            The interface to read keys from and render to.
+        `executor` : `concurrent.futures.Executor`
+            If given, the plains ahead of the nomad is generated on it
+            while the player thinks (see `Plains.prefetch`).
+        `tick` : float
+            Seconds between turns of the world. If None, the world takes
+            a turn after each key instead, as in the turn-based game.
+            Turns that fall behind the clock by less than a tick are
+            caught up at once, so a small `tick` plays faster than real
+            time; the clock starts afresh after any longer pause.
+        `frame_rate` : float
+            Most frames drawn per second.
+
+    Selecting an entity in reach is still a modal prompt: it waits for
+    its key, and the world is paused until it is answered.
+    '''
+
+    def __init__(self, ui, executor=None, tick=TICK, frame_rate=FRAME_RATE,
+                 fd=0):
+        self.ui = ui
+        self.nomad = ui.nomad
+        self.plains = ui.plains
+        self.executor = executor
+        self.tick = tick
+        self.frame_time = 1 / frame_rate
+        self.fd = fd
+        self.turn = 0
+        self._dirty = None
+        self._over = None
+
+    def run(self):
+        '''Play until the nomad dies.'''
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self._dirty = asyncio.Event()
+        self._over = loop.create_future()
+
+        tasks = [asyncio.create_task(self.render_frames())]
+        if self.tick is not None:
+            tasks.append(asyncio.create_task(self.tick_world()))
+        for task in tasks:
+            task.add_done_callback(self._task_done)
+
+        self.ui.set_nodelay(True)
+        loop.add_reader(self.fd, self.read_input)
+        self.prefetch()
+        self.changed()
+        try:
+            await self._over
+        finally:
+            loop.remove_reader(self.fd)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.ui.set_nodelay(False)
+        self.ui.render()
+
+    def changed(self):
+        '''Ask for the screen to be redrawn with the next frame.'''
+        self._dirty.set()
+
+    def prefetch(self):
+        if self.executor is not None:
+            if self.ui.recording is not None:
+                self.ui.recording.record('prefetch')
+            self.plains.prefetch(self.executor)
+
+    def finish(self, exc=None):
+        '''End the game, raising `exc` from `main` if given.'''
+        if self._over.done():
+            return
+        if exc is None:
+            self._over.set_result(None)
+        else:
+            self._over.set_exception(exc)
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.finish(task.exception())
+
+    def read_input(self):
+        '''Handle every key waiting to be read.'''
+        try:
+            with telemetry.phase('input'):
+                key = self.ui.plains_win.getch()
+                while key != -1 and not self._over.done():
+                    self.ui.handle_key(key)
+                    if self.tick is None:
+                        self.take_turn()
+                    elif not self.nomad.as_mortal.alive:
+                        self.finish()
+                    key = self.ui.plains_win.getch()
+            self.prefetch()
+            self.changed()
+        except Exception as exc:
+            # Callbacks can't raise into `main`, so hand it over.
+            self.finish(exc)
+
+    def take_turn(self):
+        '''Update every active entity once.'''
+        update_entities(self.nomad, self.plains)
+        self.turn += 1
+        telemetry.count('turns')
+        if self.ui.recording is not None:
+            self.ui.recording.end_turn(self.nomad, self.plains)
+        self.changed()
+        if not self.nomad.as_mortal.alive:
+            self.finish()
+
+    async def tick_world(self):
+        '''Take a turn every `tick` seconds.'''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.tick
+            now = loop.time()
+            if now - deadline > self.tick:
+                # The loop was blocked, by a prompt or a suspended
+                # terminal; the world was paused, so don't make up for it.
+                deadline = now
+            # Sleeping for no time at all still lets input in, when the
+            # world is catching up.
+            await asyncio.sleep(max(0, deadline - now))
+            self.take_turn()
+
+    async def render_frames(self):
+        '''Redraw the screen whenever something changed, at most once per
+        frame.
+        '''
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            with telemetry.phase('render'):
+                self.ui.render()
+            await asyncio.sleep(self.frame_time)
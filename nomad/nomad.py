@@ -1,3 +1,4 @@
+from nomad.content import default as default_content
 from nomad.entity import Entity, Stats
 from nomad.roles import *
 from nomad.entities import *
@@ -6,22 +7,41 @@ from nomad.entities import *
 class Nomad(Entity):
     '''The player-controlled entity.'''
 
-    object_factory = {
-        frozenset(('sharp rock', 'stick')): (3, spear),
-        }
+    __slots__ = ('los', 'ui')
 
-    def __init__(self, los, stats=Stats(3, 3, 3)):
+    recipes = default_content().recipe_book(kinds)
+
+    def __init__(self, los, stats=None):
         '''Initialize the nomad.
 
         :Parameters:
             `los` : int
                 How far the nomad sees in any direction. Should be
                 equal to the plains' radius, once set.
+
+        The nomad's ``ui`` must be set to an object providing
+        ``select_adjacent_entity`` (such as an `Interface`) before it
+        can select anything in reach.
         '''
-        super().__init__('nomad', False, stats, roles=dict(
+        if stats is None:
+            stats = Stats(3, 3, 3)
+        super().__init__('nomad', False, stats=stats, roles=dict(
                          mortal=Mortal(),
-                         tactile=Tactile(self.object_factory)))
+                         tactile=Tactile(self.recipes)))
         self.los = los
+        self.ui = None
+
+    def __getstate__(self):
+        '''Pickle the nomad without its user interface.'''
+        state = super().__getstate__()
+        state[1]['ui'] = None
+        return state
+
+    def select_in_reach(self):
+        '''Let the player choose an entity in reach through the nomad's
+        user interface.
+        '''
+        return self.ui.select_adjacent_entity()
 
     def move(self, dx, dy):
         '''Move the nomad, shifting the plains with it to simulate
@@ -0,0 +1,159 @@
+'''flow fields, by which actors find their way to or from a goal
+
+A `FlowField` holds, for each point a goal can be walked to from, the
+number of steps the walk takes: a Dijkstra map. An actor finds its way by
+stepping to whichever neighbour costs least, so however many actors head
+for the same goal, the search is made only once. A field for fleeing is
+made from one towards the goal, by scaling its costs by `FLEE_FACTOR` and
+searching again, so that fleeing actors make for open ground rather than
+corners.
+
+Each plains has a `Pathfinder`, which makes the fields for a goal at most
+once per turn and shares them among all its actors.
+'''
+from heapq import heapify, heappop, heappush
+
+from nomad.util import *
+
+#: What the costs of a field towards a goal are scaled by to make one
+#: away from it. Below -1, fleeing actors will walk past the goal to
+#: reach open ground, rather than be cornered.
+FLEE_FACTOR = -1.2
+
+
+class FlowField:
+    '''The cost of reaching a goal from each point of a `Plains`, by world
+    (x, y) coordinates.
+    '''
+
+    __slots__ = ('plains', 'costs')
+
+    def __init__(self, plains, costs):
+        self.plains = plains
+        self.costs = costs
+
+    def cost(self, x, y):
+        '''Return the cost at local point (x, y), or None if the goal
+        can't be reached from it.
+        '''
+        ox, oy = self.plains.origin
+        return self.costs.get((x + ox, y + oy))
+
+    def step(self, x, y):
+        '''Return the (dx, dy) of the cheapest step that can be walked from
+        local point (x, y), or None if no step is cheaper than standing
+        still.
+        '''
+        ox, oy = self.plains.origin
+        wx, wy = x + ox, y + oy
+        costs = self.costs
+        best_cost = costs.get((wx, wy))
+        if best_cost is None:
+            return None
+        walkable_at = self.plains.walkable_at
+        best = None
+        for dx, dy in DIRECTIONS:
+            cost = costs.get((wx + dx, wy + dy))
+            if (cost is not None and cost < best_cost and
+                    walkable_at(x + dx, y + dy)):
+                best, best_cost = (dx, dy), cost
+        return best
+
+
+class Pathfinder:
+    '''Makes and shares the flow fields of a `Plains`.
+
+    Fields are made around the plains' obstacles: the cells blocked by
+    anything but an actor, since actors move out of each other's way.
+    They last until the end of the turn (see `Scheduler.turn`), or for as
+    long after that as neither the obstacles nor the plains move.
+    '''
+
+    def __init__(self, plains):
+        self.plains = plains
+        # The turn and origin the fields were made on, the obstacles they
+        # were made around, and the fields by direction and goal.
+        self._turn = None
+        self._origin = None
+        self._obstacles = None
+        self._fields = {}
+
+    def obstacles(self):
+        '''Return the world points of the cells no actor can walk through.'''
+        cells = self.plains.cells
+        obstacles = set()
+        for wx, wy in self.plains.blockers:
+            for entity in cells[(wx, wy)]:
+                if not entity.walkable and entity.as_actor is None:
+                    obstacles.add((wx, wy))
+                    break
+        return obstacles
+
+    def towards(self, x, y):
+        '''Return the `FlowField` towards local point (x, y).'''
+        ox, oy = self.plains.origin
+        return self._field(('towards', x + ox, y + oy))
+
+    def away(self, x, y):
+        '''Return the `FlowField` away from local point (x, y).'''
+        ox, oy = self.plains.origin
+        return self._field(('away', x + ox, y + oy))
+
+    def _field(self, key):
+        plains = self.plains
+        turn = plains.scheduler.turn
+        if turn != self._turn:
+            self._turn = turn
+            obstacles = self.obstacles()
+            if (obstacles != self._obstacles or
+                    plains.origin != self._origin):
+                self._origin = plains.origin
+                self._obstacles = obstacles
+                self._fields = {}
+        field = self._fields.get(key)
+        if field is None:
+            direction, wx, wy = key
+            if direction == 'towards':
+                costs = self._search(wx, wy)
+            else:
+                costs = self._flee(self._field(('towards', wx, wy)).costs)
+            field = self._fields[key] = FlowField(plains, costs)
+        return field
+
+    def _search(self, wx, wy):
+        # Steps all cost the same, so the search is breadth first.
+        cells = self.plains.cells
+        obstacles = self._obstacles
+        costs = {(wx, wy): 0}
+        frontier = [(wx, wy)]
+        cost = 0
+        while frontier:
+            cost += 1
+            next_frontier = []
+            for x, y in frontier:
+                for dx, dy in DIRECTIONS:
+                    point = (x + dx, y + dy)
+                    if (point in costs or point in obstacles or
+                            point not in cells):
+                        continue
+                    costs[point] = cost
+                    next_frontier.append(point)
+            frontier = next_frontier
+        return costs
+
+    def _flee(self, towards):
+        costs = dict((point, cost * FLEE_FACTOR)
+                     for point, cost in towards.items())
+        heap = [(cost, point) for point, cost in costs.items()]
+        heapify(heap)
+        while heap:
+            cost, (x, y) = heappop(heap)
+            if cost > costs[(x, y)]:
+                continue
+            cost += 1
+            for dx, dy in DIRECTIONS:
+                point = (x + dx, y + dy)
+                if cost < costs.get(point, cost):
+                    costs[point] = cost
+                    heappush(heap, (cost, point))
+        return costs
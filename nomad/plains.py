@@ -1,16 +1,61 @@
 '''the dynamically generated world in which Nomad takes place'''
+from collections.abc import Mapping
+from functools import lru_cache
+import random
+
 from nomad.entity import Entity
+from nomad.events import EventBus, Moved, ShiftedOut
+from nomad.fov import FieldOfView
+from nomad.pathfind import Pathfinder
+from nomad.scheduler import Scheduler
+from nomad.spatial import SpatialIndex
+from nomad.telemetry import stats as telemetry
 from nomad.util import *
 
 class Plains:
-    '''A shifting world that generates itself as it moves.'''
+    '''A shifting world that generates itself as it moves.
+
+    If given a `World`, the plains takes the cells that come into sight
+    from it and hands back the cells that leave, instead of generating
+    and forgetting them.
+
+    ``rng`` is the `random.Random` behind the plains' own random choices.
+    ``cells`` holds the same cells as ``entities``, by world (x, y).
+    ``blockers`` is the set of world (x, y) coordinates of the cells that
+    can't be walked over, ``fov`` is the `FieldOfView` from the plains'
+    center, ``paths`` is the `Pathfinder` its actors share, and
+    ``events`` is the `EventBus` for what happens on it.
+    '''
 
-    def __init__(self, entities, floor_entity, generate):
-        self.entities = entities
+    def __init__(self, entities, floor_entity, generate, world=None,
+                 origin=Point(0, 0)):
+        self.entities = Ring(entities, origin)
+        # The same cells by world point, for looking them up without
+        # going through the ring's bounds check and wrapping.
+        self.cells = {}
+        ox, oy = origin
+        for xy, ents in self.entities.items():
+            cell = self.entities[xy] = Cell.of(ents)
+            self.cells[(xy[0] + ox, xy[1] + oy)] = cell
         self.floor_entity = floor_entity
         self.generate = generate
+        self.world = world
+        self.scheduler = Scheduler()
+        self.index = SpatialIndex()
+        self.blockers = set()
+        self.events = EventBus()
+        self.rng = random.Random()
+        # Futures of generated edges, and the seeds they were generated
+        # from, by the shift they are for.
+        self.prefetched = {}
+        self.prefetch_seeds = {}
 
         self._init_entities(self.entities)
+        self.fov = FieldOfView(self)
+        self.paths = Pathfinder(self)
+
+    origin = property(lambda self: self.entities.origin, doc=
+        '''World coordinates of the plains' local (0, 0).''')
 
     @classmethod
     def with_floor(cls, floor_entity, generate, *shape_args, **shape_kws):
@@ -18,6 +63,14 @@ class Plains:
         return cls(Octagon(*shape_args, **shape_kws),
                    floor_entity, generate)
 
+    @classmethod
+    def in_world(cls, world, *shape_args, **shape_kws):
+        '''Make a plains in a `World`, centered on the world's origin.'''
+        entities = Octagon(*shape_args, **shape_kws)
+        for xy in entities:
+            entities[xy] = world.take(*xy)
+        return cls(entities, world.floor_entity, world.generate, world)
+
     @staticmethod
     def _iter_entities(entities):
         for (x, y), ents in entities.items():
@@ -25,11 +78,10 @@ class Plains:
                 yield (x, y, z), e
 
     def _inform_entity(self, entity, x, y, z):
-        '''Inform an entity of its xy positon.'''
-        assert self.entities.in_bounds(x, y)
+        '''Inform an entity of its xy positon and its cell.'''
+        entity.cell = self.cell_at(x, y)
         entity.x = x
         entity.y = y 
-        entity.z = z
 
     def _inform_entities(self, entities):
         '''Inform many  entities of their xy positions.'''
@@ -37,22 +89,80 @@ class Plains:
             self._inform_entity(entity, *point)
 
     def _init_entity(self, entity, x, y, z):
+        # Shared prototypes have no position of their own.
+        if entity.shared:
+            return
         entity.plains = self
         self._inform_entity(entity, x, y, z)
+        self.scheduler.add(entity)
+        reactor = entity.as_reactor
+        if reactor is not None:
+            for event_type in reactor.events:
+                self.events.subscribe(event_type, reactor.react_to, entity)
 
     def _init_entities(self, entities):
+        ox, oy = self.origin
+        blockers = self.blockers
         for (x, y, z), e in self._iter_entities(entities):
             self._init_entity(e, x, y, z)
+            if not e.walkable:
+                blockers.add((x + ox, y + oy))
+        for (x, y), ents in entities.items():
+            self.index.add_cell(ents, x + ox, y + oy)
+
+    def cell_at(self, x, y):
+        '''Return the `Cell` at local point (x, y), or raise KeyError if
+        it is out of bounds.
+        '''
+        ox, oy = self.entities.origin
+        return self.cells[(x + ox, y + oy)]
 
     def walkable_at(self, x, y):
         '''Are all entities walkable at point (x, y)?'''
-        xy = (x, y)
-        return (xy in self.entities and
-                all(e.walkable for e in self.entities[xy]))
+        ox, oy = self.entities.origin
+        cell = self.cells.get((x + ox, y + oy))
+        return cell is not None and not cell.blocking
 
     def get_entity(self, x, y, z=-1):
         '''Return the entity at the given coordinates on this plains.'''
-        return self.entities[(x, y)][z]
+        ox, oy = self.entities.origin
+        return self.cells[(x + ox, y + oy)][z]
+
+    def claim_entity(self, x, y, z=-1):
+        '''Return the entity at the given coordinates, first replacing it
+        with an entity of its own if it is a shared prototype.
+
+        Use this rather than `get_entity` to get an entity that may be
+        changed, moved or removed.
+        '''
+        entities = self.cell_at(x, y)
+        entity = entities[z]
+        if entity.shared:
+            entity = entity.factory()
+            entities[z] = entity
+            self._init_entity(entity, x, y, z % len(entities))
+        return entity
+
+    def find(self, name=None, role=None):
+        '''Return the (x, y) points holding an entity with the given name,
+        or the given role (see `entity.ROLE_NAMES`).
+        '''
+        ox, oy = self.origin
+        return [Point(x - ox, y - oy)
+                for x, y in self.index.find(name, role)]
+
+    def nearest(self, x, y, name=None, role=None):
+        '''Return the nearest (x, y) point to (x, y) holding an entity with
+        the given name, or the given role, or None if there is none.
+
+        Distance is counted in steps, diagonals included.
+        '''
+        ox, oy = self.origin
+        radius = max(self.entities.width, self.entities.height)
+        xy = self.index.nearest(x + ox, y + oy, name, role, radius)
+        if xy is None:
+            return None
+        return Point(xy.x - ox, xy.y - oy)
 
     def get_entities(self):
         '''Yield each entity on this plains in an arbitrary order.'''
@@ -68,70 +178,307 @@ class Plains:
 
     def z_in_bounds(self, x, y, z):
         '''Does an entity exist at (x, y, z)?'''
-        return 0 <= z < len(self.entities[(x, y)])
+        return 0 <= z < len(self.cell_at(x, y))
     
     def add_entity(self, entity, x, y, z=-1):
         '''Add an entity at the given x, y, z. If z is -1, append it to
         the top.
         '''
-        entities = self.entities[(x, y)]
+        entities = self.cell_at(x, y)
 
         # If z is -1, append entity to the top.
         if z == -1:
             entities.append(entity)
             z = len(entities) - 1
-        # Else, if z is in bounds, insert entity at z.
+        # Else, if z is in bounds, insert entity at z. The entities above
+        # need no renumbering, as z is derived from the cell.
         elif self.z_in_bounds(x, y, z):
             entities.insert(z, entity)
-            # Update z coords of above entities.
-            for entity in entities[z:]:
-                entity.z += 1
         # Otherwise, terminate.
         else:
             return
         # Initialize the entity at its new position.
         self._init_entity(entity, x, y, z)
+        self.index.add(entity, x + self.origin.x, y + self.origin.y)
+        if not entity.walkable:
+            self.blockers.add((x + self.origin.x, y + self.origin.y))
 
     def pop_entity(self, x, y, z=-1):
         '''Remove and return the entity at the given x, y, z. If z is -1,
         pop the topmost entity.
         '''
-        return self.entities[(x, y)].pop(z)
+        entities = self.cell_at(x, y)
+        entity = entities.pop(z)
+        entity.cell = None
+        self.scheduler.discard(entity)
+        self.events.forget(entity)
+        self.index.remove(entity, x + self.origin.x, y + self.origin.y)
+        if not entity.walkable and not entities.blocking:
+            self.blockers.discard((x + self.origin.x, y + self.origin.y))
+        return entity
 
     def remove_entity(self, entity):
-        entities = self.entities[entity.pos]
-        z = entity.z
-        # Delete the entity at its x, y, z position.
-        del entities[z]
-        # Update z coords of above entities.
-        for entity in entities[z:]:
-            entity.z -= 1
+        # Delete the entity from its cell.
+        cell = entity.cell
+        cell.remove(entity)
+        entity.cell = None
+        self.scheduler.discard(entity)
+        self.events.forget(entity)
+        self.index.remove(entity, entity.wx, entity.wy)
+        if not entity.walkable and not cell.blocking:
+            self.blockers.discard((entity.wx, entity.wy))
 
     def move_entity(self, entity, x, y, z=-1):
         '''Remove the entity at (x1, y1, z1) and add it to (x2, y2, z2).'''
+        telemetry.count('moved')
+        source = (entity.wx, entity.wy)
         self.remove_entity(entity)
         self.add_entity(entity, x, y, z)
+        if self.events.wants(Moved):
+            self.events.post(Moved(entity, source, (entity.wx, entity.wy)))
 
     def shift(self, dx, dy):
-        assert dx or dy
-        gen_coords = set()
+        '''Shift all entities by (dx, dy) and generate new entities to
+        fill the open edge.
 
-        # Shift all entities by (dx, dy).
-        entities = Octagon(*self.entities.params)
-        for (x, y), ents in self.entities.items():
-            new_point = Point(x + dx, y + dy)
-            # Only move entity if new point is in bounds.
-            if self.entities.in_bounds(*new_point):
-                entities[new_point] = ents
-            else:
-                gen_coords.add(Point(-x, -y))
-
-        # Generate new entities to fill open edge.
-        new_entities = self.generate(self, gen_coords)
+        Only the cells leaving and entering the plains are touched;
+        everything else stays put in the backing `Ring`.
+        '''
+        assert dx or dy
+        with telemetry.phase('shift'):
+            self._shift(dx, dy)
+
+    def _shift(self, dx, dy):
+        leaving, entering = self.entities.edges(dx, dy)
+
+        # Forget the cells that fall off the trailing edge, handing them
+        # back to the world if there is one.
+        ox, oy = self.origin
+        events = self.events
+        for xy in leaving:
+            entities = self.entities[xy]
+            for entity in entities:
+                self.scheduler.discard(entity)
+                if not entity.shared:
+                    # Anything listening hears of it before it goes.
+                    if events.wants(ShiftedOut):
+                        events.publish(ShiftedOut(entity))
+                    events.forget(entity)
+            self.index.remove_cell(entities, xy.x + ox, xy.y + oy)
+            self.blockers.discard((xy.x + ox, xy.y + oy))
+            if self.world is not None:
+                for entity in entities:
+                    if not entity.shared:
+                        entity.plains = None
+                self.world.put(xy.x + ox, xy.y + oy, entities)
+            self.entities[xy] = None
+            del self.cells[(xy.x + ox, xy.y + oy)]
+        self.entities.move_origin(-dx, -dy)
+
+        # Generate new entities to fill open edge, or take them from the
+        # world.
+        with telemetry.phase('generate'):
+            new_entities = self._generate_edge(dx, dy, entering)
+        ox, oy = self.origin
+        for xy, ents in new_entities.items():
+            cell = self.entities[xy] = Cell.of(ents)
+            self.cells[(xy[0] + ox, xy[1] + oy)] = cell
         self._init_entities(new_entities)
-        self._inform_entities(entities)
-        entities.update(new_entities)
-        self.entities = entities
+
+    def _generate_edge(self, dx, dy, entering):
+        if self.world is not None:
+            ox, oy = self.origin
+            return dict((xy, self.world.take(xy.x + ox, xy.y + oy))
+                        for xy in entering)
+
+        prefetched = self.prefetched.pop((dx, dy), None)
+        seed = self.prefetch_seeds.get((dx, dy))
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched = {}
+        self.prefetch_seeds = {}
+        if prefetched is not None:
+            return prefetched.result()
+        if seed is not None:
+            # The edge was seeded but not generated ahead; generate it
+            # just as it would have been.
+            return self._generate(entering, self.origin, random.Random(seed))
+        return self._generate(entering, self.origin)
+
+    def _generate(self, entering, origin, rng=None):
+        # Generators work in world coordinates, so that they may lay out
+        # the world by where things are in it.
+        ox, oy = origin
+        points = [Point(x + ox, y + oy) for x, y in entering]
+        if rng is None:
+            cells = self.generate(self, points)
+        else:
+            cells = self.generate(self, points, rng)
+        return dict((Point(x - ox, y - oy), cell)
+                    for (x, y), cell in cells.items())
+
+    def prefetch(self, executor):
+        '''Start generating the edge for each of the eight ways the plains
+        may shift next, using `executor` (a `concurrent.futures.Executor`).
+
+        Call this while waiting on the player. The next `shift` takes the
+        edge it needs ready-made, and discards the rest. On a plains in a
+        `World`, the chunks those edges fall in are prefetched instead.
+
+        If `executor` is None, the edges' seeds are drawn but nothing is
+        generated ahead; the next `shift` generates its edge from its
+        seed, just as the executor would have.
+        '''
+        if self.world is not None:
+            if executor is None:
+                return
+            ox, oy = self.origin
+            keys = set()
+            for dx, dy in DIRECTIONS:
+                _, entering = self.entities.edges(dx, dy)
+                keys.update(self.world.chunk_key(x + ox - dx, y + oy - dy)
+                            for x, y in entering)
+            self.world.prefetch(executor, keys)
+            return
+
+        for dx, dy in DIRECTIONS:
+            if (dx, dy) in self.prefetch_seeds:
+                continue
+            # Each edge gets a generator of its own, seeded in a fixed
+            # order, so that prefetching stays reproducible.
+            seed = self.prefetch_seeds[(dx, dy)] = self.rng.random()
+            if executor is not None:
+                _, entering = self.entities.edges(dx, dy)
+                # The origin the plains will have after the shift.
+                origin = (self.origin.x - dx, self.origin.y - dy)
+                self.prefetched[(dx, dy)] = executor.submit(
+                    self._generate, entering, origin, random.Random(seed))
+
+
+class Cell(list):
+    '''A stack of entities on one point of the plains, bottom first.
+
+    A cell counts the entities on it that can't be walked over, so that
+    `Plains.walkable_at` needn't look at each of them. The count is only
+    taken the first time it is asked for, then kept up to date.
+    '''
+
+    __slots__ = ('_blocking',)
+
+    @classmethod
+    def of(cls, entities):
+        '''Return `entities` as a cell, reusing it if it is one already.'''
+        if type(entities) is cls:
+            return entities
+        return cls(entities)
+
+    def __reduce__(self):
+        return Cell, (list(self),)
+
+    def _get_blocking(self):
+        try:
+            return self._blocking
+        except AttributeError:
+            self._blocking = [e.walkable for e in self].count(False)
+            return self._blocking
+    blocking = property(_get_blocking, doc=
+        '''How many entities on the cell can't be walked over?''')
+
+    top = property(lambda self: self[-1], doc=
+        '''The topmost entity.''')
+
+    def _count(self, entity, n):
+        if not entity.walkable and hasattr(self, '_blocking'):
+            self._blocking += n
+
+    def append(self, entity):
+        super().append(entity)
+        self._count(entity, 1)
+
+    def insert(self, z, entity):
+        super().insert(z, entity)
+        self._count(entity, 1)
+
+    def pop(self, z=-1):
+        entity = super().pop(z)
+        self._count(entity, -1)
+        return entity
+
+    def remove(self, entity):
+        super().remove(entity)
+        self._count(entity, -1)
+
+    def __setitem__(self, z, entity):
+        self._count(self[z], -1)
+        super().__setitem__(z, entity)
+        self._count(entity, 1)
+
+    def __delitem__(self, z):
+        self._count(self[z], -1)
+        super().__delitem__(z)
+
+
+class Ring(Mapping):
+    '''A fixed grid of cells laid over a shape, mapping local (x, y)
+    points to values.
+
+    Local points are relative to a movable world `origin`. The backing
+    grid wraps around toroidally, so moving the origin never rebuilds
+    it: a cell keeps its slot for as long as it stays in bounds.
+    '''
+
+    def __init__(self, shape, origin=Point(0, 0)):
+        self.up = shape.up
+        self.right = shape.right
+        self.down = shape.down
+        self.left = shape.left
+        self.params = shape.params
+        self.geometry = shape.geometry
+
+        self.width = self.right - self.left + 1
+        self.height = self.down - self.up + 1
+        self.origin = origin
+        self.points = self.geometry.members
+        self.grid = [None] * (self.width * self.height)
+
+        for xy, value in shape.items():
+            self[xy] = value
+
+    def _index(self, x, y):
+        return (((y + self.origin.y) % self.height) * self.width +
+                (x + self.origin.x) % self.width)
+
+    def __getitem__(self, xy):
+        if xy not in self.points:
+            raise KeyError(xy)
+        return self.grid[self._index(*xy)]
+
+    def __setitem__(self, xy, value):
+        if xy not in self.points:
+            raise KeyError(xy)
+        self.grid[self._index(*xy)] = value
+
+    def __contains__(self, xy):
+        return xy in self.points
+
+    def __iter__(self):
+        return iter(self.geometry.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def in_bounds(self, x, y):
+        return (x, y) in self.points
+
+    def move_origin(self, dx, dy):
+        '''Move the world origin by (dx, dy).'''
+        self.origin = Point(self.origin.x + dx, self.origin.y + dy)
+
+    def edges(self, dx, dy):
+        '''Return the local points that leave and the local points that
+        enter the shape when its contents shift by (dx, dy).
+        '''
+        return self.geometry.delta(dx, dy)
 
 
 class Octagon(dict):
@@ -170,13 +517,56 @@ class Octagon(dict):
         self.default = default
 
         self.params = (up, right, down, left, ul, ur, lr, ll, default)
+        self.geometry = geometry(up, right, down, left, ul, ur, lr, ll)
 
-        for y in range(self.up, self.down + 1):
-            for x in range(self.left, self.right + 1):
-                if self.in_bounds(x, y):
-                    self[Point(x, y)] = default()
+        for xy in self.geometry.points:
+            self[xy] = default()
 
     def in_bounds(self, x, y):
+        return (x, y) in self.geometry.members
+
+
+@lru_cache(maxsize=None)
+def geometry(up, right, down, left, ul, ur, lr, ll):
+    '''Return the `Geometry` of the octagon with the given boundaries,
+    computing it only the first time it is asked for.
+    '''
+    return Geometry(up, right, down, left, ul, ur, lr, ll)
+
+
+class Geometry:
+    '''The precomputed shape of an octagon (see `Octagon` for the
+    meaning of its boundaries).
+
+    `Properties`
+        `points` : tuple of `Point`
+            Every point in the octagon, row by row.
+        `members` : frozenset of `Point`
+            The same points, for membership tests.
+        `edges` : dict
+            Maps each direction in `DIRECTIONS` to the points, row by
+            row, whose neighbor in that direction lies outside the
+            octagon.
+    '''
+
+    def __init__(self, up, right, down, left, ul, ur, lr, ll):
+        self.up = up
+        self.right = right
+        self.down = down
+        self.left = left
+        self.ul = ul
+        self.ur = ur
+        self.lr = lr
+        self.ll = ll
+
+        self.points = tuple(Point(x, y)
+                            for y in range(up, down + 1)
+                            for x in range(left, right + 1)
+                            if self._in_bounds(x, y))
+        self.members = frozenset(self.points)
+        self.edges = dict((d, self._edge(*d)) for d in DIRECTIONS)
+
+    def _in_bounds(self, x, y):
         if x < self.left:  return False
         if x > self.right: return False
         if y < self.up:    return False
@@ -189,4 +579,15 @@ class Octagon(dict):
 
         return True
 
+    def _edge(self, dx, dy):
+        members = self.members
+        return tuple(p for p in self.points
+                     if (p.x + dx, p.y + dy) not in members)
 
+    def delta(self, dx, dy):
+        '''Return the points that leave and the points that enter the
+        octagon when its contents shift by (dx, dy).
+        '''
+        if (dx, dy) in self.edges:
+            return self.edges[(dx, dy)], self.edges[(-dx, -dy)]
+        return self._edge(dx, dy), self._edge(-dx, -dy)
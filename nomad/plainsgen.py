@@ -1,34 +1,260 @@
-'''algorithms for dynamic generation of the plains'''
+'''algorithms for dynamic generation of the plains
+
+Each algorithm returns a generator: a function taking a `Plains` (or a
+`World`) and a collection of (x, y) points in world coordinates, and
+returning a dict mapping each point to a new list (preferably a `Cell`)
+of entities. A generator may also be passed an ``rng`` (a
+`random.Random`) to draw from instead of its own. A generator that draws
+from a `random.Random` of its own exposes it as its ``rng`` attribute, so
+that its state can be saved and restored.
+'''
+from bisect import bisect_right
+import math
 import random as rand
 
+from nomad.plains import Cell
 from nomad.util import *
 
 def background():
-    def generate(plains, edge_coords):
-        return dict((xy, [plains.floor_entity()]) for xy in edge_coords)
+    def generate(plains, edge_coords, rng=None):
+        return dict((xy, Cell((plains.floor_entity(),)))
+                    for xy in edge_coords)
     return generate
 
 
-def random(*entities):
-    def generate(plains, edge_coords):
-        new_ents = {}
-        for xy in edge_coords:
-            new_ents[xy] = [plains.floor_entity(), rand.choice(entities)()]
-        return new_ents
+def materialize(plains, edge_coords, kinds):
+    '''Return a dict mapping each point to a `Cell` holding a floor
+    entity, topped with a new entity of the corresponding kind if it is
+    not None.
+    '''
+    new_ents = {}
+    for xy, kind in zip(edge_coords, kinds):
+        if kind is None:
+            new_ents[xy] = Cell((plains.floor_entity(),))
+        else:
+            new_ents[xy] = Cell((plains.floor_entity(), kind()))
+    return new_ents
+
+
+def random(*entities, seed=None):
+    own_rng = rand.Random(seed)
+    def generate(plains, edge_coords, rng=own_rng):
+        kinds = rng.choices(entities, k=len(edge_coords))
+        return materialize(plains, edge_coords, kinds)
+    generate.rng = own_rng
     return generate
 
 
-def chance(prob2ent):
-    probs = sorted(prob2ent.keys(), key=lambda x: x + rand.random())
-    def generate(plains, edge_coords):
-        new_ents = {}
-        for xy in edge_coords:
-            new_ents[xy] = [plains.floor_entity()]
-            roll = rand.random()
-            for prob in probs:
-                if roll * 100 <= prob:
-                    entity = prob2ent[prob]
-                    new_ents[xy].append(entity())
-                    break
-        return new_ents
+class Table:
+    '''A cumulative probability table of entity factories.
+
+    Built from a dict mapping percentages to factories: a roll picks the
+    factory with the smallest percentage at or above it, or None if the
+    roll is above every percentage.
+    '''
+
+    def __init__(self, prob2ent):
+        probs = sorted(prob2ent)
+        self.kinds = [prob2ent[prob] for prob in probs] + [None]
+        self.cum_weights = [min(prob, 100) for prob in probs] + [100]
+
+    @classmethod
+    def compiled(cls, kinds, cum_weights):
+        '''Make a table from factories and their cumulative percentages,
+        already in order (see `nomad.content`).
+        '''
+        table = cls.__new__(cls)
+        table.kinds = list(kinds) + [None]
+        table.cum_weights = list(cum_weights) + [100]
+        return table
+
+    def pick(self, roll):
+        '''Return the factory (or None) picked by a roll in [0, 100).'''
+        return self.kinds[bisect_right(self.cum_weights, roll)]
+
+    def roll(self, n, rng):
+        '''Roll `n` times and return the list of factories (or None)
+        picked.
+        '''
+        return rng.choices(self.kinds, cum_weights=self.cum_weights, k=n)
+
+
+def chance(prob2ent, seed=None):
+    '''Fill each point from a `Table`, or a dict to make one from.'''
+    table = prob2ent if isinstance(prob2ent, Table) else Table(prob2ent)
+    own_rng = rand.Random(seed)
+    def generate(plains, edge_coords, rng=own_rng):
+        kinds = table.roll(len(edge_coords), rng)
+        return materialize(plains, edge_coords, kinds)
+    generate.rng = own_rng
+    return generate
+
+
+#: Cells across the features of the noise that lays out biomes.
+BIOME_SCALE = 32
+#: Cells across the clusters within a biome.
+CLUSTER_SCALE = 5
+#: The cluster noise above which a biome's clusters are laid out.
+CLUSTER_THRESHOLD = 0.6
+
+_MASK = (1 << 64) - 1
+
+
+def hash_point(seed, x, y):
+    '''Return a number in [0, 1) that depends only on the integer seed and
+    the point, for drawing the same at a point however often it is
+    visited.
+    '''
+    h = (seed * 0x9E3779B97F4A7C15 + x * 0xC2B2AE3D27D4EB4F +
+         y * 0x165667B19E3779F9) & _MASK
+    h ^= h >> 31
+    h = (h * 0xBF58476D1CE4E5B9) & _MASK
+    h ^= h >> 27
+    h = (h * 0x94D049BB133111EB) & _MASK
+    h ^= h >> 31
+    return (h >> 11) / (1 << 53)
+
+
+def _subseed(seed, n):
+    # An integer seed of its own for the `n`th use of `seed`.
+    return int(hash_point(seed, n, 0) * (1 << 53))
+
+
+class ValueNoise:
+    '''Smooth, seeded noise in [0, 1), defined at every point.
+
+    Random values on a lattice `scale` cells apart are blended across the
+    cells between, and `octaves` of finer lattices, each half the size
+    and weight of the last, are added for detail.
+    '''
+
+    __slots__ = ('seeds', 'scales', 'weights')
+
+    def __init__(self, seed, scale, octaves=2):
+        self.seeds = [_subseed(seed, octave) for octave in range(octaves)]
+        self.scales = [scale / 2 ** octave for octave in range(octaves)]
+        total = sum(0.5 ** octave for octave in range(octaves))
+        self.weights = [0.5 ** octave / total for octave in range(octaves)]
+
+    def sample(self, points):
+        '''Return a list of the noise at each (x, y) point.
+
+        Points are sampled in bulk: the corners of each lattice square
+        are drawn once however many points fall in it, which for a strip
+        or a chunk of neighbouring points is far fewer than once per
+        point.
+        '''
+        values = [0.0] * len(points)
+        floor = math.floor
+        for seed, scale, weight in zip(self.seeds, self.scales,
+                                       self.weights):
+            # The lattice value at the top left of each lattice square,
+            # and the three others at its corners.
+            squares = {}
+            for i, (x, y) in enumerate(points):
+                fx = x / scale
+                fy = y / scale
+                ix = floor(fx)
+                iy = floor(fy)
+                square = squares.get((ix, iy))
+                if square is None:
+                    square = squares[(ix, iy)] = (
+                        hash_point(seed, ix, iy),
+                        hash_point(seed, ix + 1, iy),
+                        hash_point(seed, ix, iy + 1),
+                        hash_point(seed, ix + 1, iy + 1))
+                a, b, c, d = square
+                tx = fx - ix
+                ty = fy - iy
+                # Smooth the blend, so the lattice doesn't show.
+                tx = tx * tx * (3 - 2 * tx)
+                ty = ty * ty * (3 - 2 * ty)
+                top = a + (b - a) * tx
+                bottom = c + (d - c) * tx
+                values[i] += (top + (bottom - top) * ty) * weight
+        return values
+
+
+class Biome:
+    '''A kind of terrain, laid out wherever the climate is nearer its own
+    than any other biome's.
+
+    :Parameters:
+        `name` : str
+            The name of the biome.
+        `moisture`, `elevation` : float
+            The biome's climate, each in [0, 1).
+        `table` : `Table` or dict
+            What fills the biome's cells, as for `chance`.
+        `clusters` : `Table` or dict
+            What fills the biome's clusters instead, if given: its
+            groves, rock fields or herds.
+    '''
+
+    __slots__ = ('name', 'moisture', 'elevation', 'table', 'clusters')
+
+    def __init__(self, name, moisture, elevation, table, clusters=None):
+        self.name = name
+        self.moisture = moisture
+        self.elevation = elevation
+        self.table = table if isinstance(table, Table) else Table(table)
+        if clusters is not None and not isinstance(clusters, Table):
+            clusters = Table(clusters)
+        self.clusters = clusters
+
+    def __repr__(self):
+        return 'Biome({!r})'.format(self.name)
+
+
+def biomes(biome_list, seed=None, scale=BIOME_SCALE,
+           cluster_scale=CLUSTER_SCALE):
+    '''Lay out `Biome`s by coherent noise in world coordinates.
+
+    Two noise fields, moisture and elevation, give each point a climate,
+    and the point falls in the biome whose climate is nearest. A third,
+    finer field lays out clusters within each biome. What fills each cell
+    is then drawn from a hash of the point, so the generator needs no
+    `random.Random`: every point comes out the same however often, and
+    in whichever order, it is generated. Any ``rng`` passed in is
+    ignored.
+
+    `seed` must be an integer, or None for a random one. The generator's
+    ``biome_at(x, y)`` returns the `Biome` at a world point.
+    '''
+    if seed is None:
+        seed = rand.getrandbits(64)
+    moisture = ValueNoise(_subseed(seed, 1), scale)
+    elevation = ValueNoise(_subseed(seed, 2), scale)
+    clustering = ValueNoise(_subseed(seed, 3), cluster_scale, 1)
+    cell_seed = _subseed(seed, 4)
+    biome_list = list(biome_list)
+
+    def nearest(m, e):
+        best = None
+        for biome in biome_list:
+            dm = biome.moisture - m
+            de = biome.elevation - e
+            distance = dm * dm + de * de
+            if best is None or distance < best_distance:
+                best, best_distance = biome, distance
+        return best
+
+    def biome_at(x, y):
+        point = [(x, y)]
+        return nearest(moisture.sample(point)[0], elevation.sample(point)[0])
+
+    def generate(plains, edge_coords, rng=None):
+        edge_coords = list(edge_coords)
+        kinds = []
+        for (x, y), m, e, c in zip(edge_coords,
+                                   moisture.sample(edge_coords),
+                                   elevation.sample(edge_coords),
+                                   clustering.sample(edge_coords)):
+            biome = nearest(m, e)
+            table = biome.table
+            if biome.clusters is not None and c >= CLUSTER_THRESHOLD:
+                table = biome.clusters
+            kinds.append(table.pick(hash_point(cell_seed, x, y) * 100))
+        return materialize(plains, edge_coords, kinds)
+    generate.biome_at = biome_at
     return generate
@@ -0,0 +1,203 @@
+'''recording games, and replaying them from any turn
+
+A `Recording` holds everything needed to play a game again exactly: its
+seed, each command with the turn it was given on, and snapshots of the
+game (see `nomad.snapshot`) taken every so many turns. A `Replay` plays a
+recording back headless, and jumps to a turn by loading the nearest
+checkpoint before it and replaying only the turns in between.
+
+Show the state of a recorded game with ``python -m nomad.replay PATH``.
+'''
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+import pickle
+
+from nomad import snapshot
+from nomad.commands import (DIRECTION_NAMES, game_command_names,
+                            named_commands)
+from nomad.simulation import default_generator, update_entities
+
+VERSION = 1
+
+#: Turns between checkpoints.
+CHECKPOINT_INTERVAL = 1000
+
+#: The events a recording holds, by id: every command but those that
+#: don't touch the game, and the plains' prefetching of its edges, which
+#: draws from its random number generator.
+EVENTS = tuple(game_command_names()) + ('prefetch',)
+EVENT_IDS = dict((name, i) for i, name in enumerate(EVENTS))
+
+_direction_names = dict((xy, name) for name, xy in DIRECTION_NAMES.items())
+
+
+class Recording:
+    '''A game being recorded, or loaded to be replayed.
+
+    The game's interface calls `record` with the name of each command as
+    it is given, and with each direction selected in reach, and
+    `end_turn` after each turn of the world.
+    '''
+
+    def __init__(self, seed, los=6, interval=CHECKPOINT_INTERVAL):
+        self.seed = seed
+        self.los = los
+        self.interval = interval
+        self.turn = 0
+        # The turn of each event, and its id in `EVENTS`.
+        self.turns = array('I')
+        self.events = array('B')
+        #: Snapshots of the game, by the turn they begin.
+        self.checkpoints = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def record(self, name):
+        '''Record a command or event by name, or a direction by
+        (dx, dy).
+        '''
+        if not isinstance(name, str):
+            name = _direction_names[name]
+        if name in EVENT_IDS:
+            self.turns.append(self.turn)
+            self.events.append(EVENT_IDS[name])
+
+    def checkpoint(self, nomad, plains):
+        '''Take a snapshot of the game as it is.'''
+        self.checkpoints[self.turn] = snapshot.dumps(nomad, plains)
+
+    def end_turn(self, nomad, plains):
+        '''Count a turn, taking a checkpoint if one is due.'''
+        self.turn += 1
+        if self.turn % self.interval == 0:
+            self.checkpoint(nomad, plains)
+
+    def save(self, path):
+        '''Write the recording to a file.'''
+        with open(path, 'wb') as f:
+            pickle.dump({
+                'version': VERSION,
+                'seed': self.seed,
+                'los': self.los,
+                'interval': self.interval,
+                'turn': self.turn,
+                'turns': self.turns.tobytes(),
+                'events': self.events.tobytes(),
+                'checkpoints': self.checkpoints,
+                }, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        '''Read a recording from a file.'''
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state['version'] != VERSION:
+            raise ValueError('unsupported recording version {}'.format(
+                             state['version']))
+        recording = cls(state['seed'], state['los'], state['interval'])
+        recording.turn = state['turn']
+        recording.turns.frombytes(state['turns'])
+        recording.events.frombytes(state['events'])
+        recording.checkpoints = state['checkpoints']
+        return recording
+
+
+class Replay:
+    '''Plays a `Recording` back headless.
+
+    ``turn`` is the turn about to be played. The recording must hold a
+    checkpoint of turn 0.
+    '''
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.commands = named_commands()
+        self.restore(0)
+
+    def latest_checkpoint(self, turn):
+        '''Return the turn of the latest checkpoint at or before `turn`.'''
+        turns = sorted(self.recording.checkpoints)
+        return turns[bisect_right(turns, turn) - 1]
+
+    def restore(self, turn):
+        '''Load the latest checkpoint at or before `turn`.'''
+        recording = self.recording
+        start = self.latest_checkpoint(turn)
+        self.nomad, self.plains = snapshot.loads(
+            recording.checkpoints[start], default_generator(recording.seed))
+        self.nomad.ui = self
+        self.turn = start
+        # The next event to replay.
+        self.pos = bisect_left(recording.turns, start)
+
+    def seek(self, turn):
+        '''Bring the game to the start of `turn`, or as far as it went.
+
+        The game is replayed from where it is, or from the latest
+        checkpoint before `turn` if that is later or it is already past
+        `turn`.
+        '''
+        if turn < self.turn or self.latest_checkpoint(turn) > self.turn:
+            self.restore(turn)
+        while self.turn < min(turn, self.recording.turn):
+            self.step()
+
+    def next_event(self):
+        name = EVENTS[self.recording.events[self.pos]]
+        self.pos += 1
+        return name
+
+    def step(self):
+        '''Replay the events of a turn, then the turn itself.'''
+        turns = self.recording.turns
+        while self.pos < len(turns) and turns[self.pos] == self.turn:
+            name = self.next_event()
+            if name == 'prefetch':
+                self.plains.prefetch(None)
+            else:
+                self.commands[name](self.nomad)
+        update_entities(self.nomad, self.plains)
+        self.turn += 1
+
+    def select_adjacent_entity(self):
+        '''Select the entity in reach that was selected when recording.'''
+        return self.nomad.reach(*DIRECTION_NAMES[self.next_event()])
+
+
+def render(nomad, plains):
+    '''Return the plains drawn as text, as the game would draw it.'''
+    from nomad.game import render_info
+    chars = dict((name, char) for name, (char, _) in render_info().items())
+    entities = plains.entities
+    rows = [[' '] * (entities.width) for _ in range(entities.height)]
+    for (x, y), cell in entities.items():
+        rows[y + entities.down][x + entities.right] = chars[cell[-1].name]
+    return '\n'.join(''.join(row).rstrip() for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='recording to replay')
+    parser.add_argument('--turn', type=int,
+                        help='turn to show (default: the last)')
+    args = parser.parse_args(argv)
+
+    recording = Recording.load(args.path)
+    replay = Replay(recording)
+    turn = recording.turn if args.turn is None else args.turn
+    replay.seek(turn)
+
+    mortal = replay.nomad.as_mortal
+    held = replay.nomad.as_tactile.held_entities
+    print('seed {}, turn {} of {}'.format(recording.seed, replay.turn,
+                                          recording.turn))
+    print('health {:.0f}, satiation {:.0f}, holding {}'.format(
+          mortal.health, mortal.satiation,
+          ', '.join(e.name for e in held if e) or 'nothing'))
+    print(render(replay.nomad, replay.plains))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,26 @@
 '''entity behaviors'''
+from array import array
 from collections import OrderedDict
+from functools import lru_cache
+
+from nomad.events import Ate, PickedUp
+from nomad.util import DIRECTIONS
 
 class Role:
-    '''Abstract class for `Entity` behaviors.'''
+    '''Abstract class for `Entity` behaviors.
+
+    A role reaches its entity explicitly through ``self.entity``, which
+    is set by `Role.assign`.
+
+    Roles whose ``shared`` attribute is true hold no state of their own,
+    and are shared read-only by every entity of a kind (see
+    `nomad.entity.Archetype`); they are never assigned an entity. The
+    rest are copied for each entity with `Role.clone`.
+    '''
+
+    __slots__ = ('entity',)
+
+    shared = False
 
     def __init__(self):
         self.entity = None
@@ -11,12 +29,19 @@ class Role:
         '''Assign this role to an entity.'''
         self.entity = entity
 
-    def __getattr__(self, *args, **kwargs):
-        '''If an attribute is not found on the role, search its entity.
+    def clone(self):
+        '''Return an unassigned copy of the role.
 
-        A role must be assigned with `Role.assign` before this will work.
+        Slots are copied as they are, so roles holding mutable state
+        override this to copy that state too.
         '''
-        return getattr(self.entity, *args, **kwargs)
+        cls = type(self)
+        role = cls.__new__(cls)
+        for slot in _slot_names(cls):
+            if hasattr(self, slot):
+                setattr(role, slot, getattr(self, slot))
+        role.entity = None
+        return role
 
     def update(self, nomad):
         '''Update the entity assigned to this role, given a `Nomad`.
@@ -36,7 +61,11 @@ class Role:
 class Matter(Role):
     '''Something with physical properties.'''
 
+    __slots__ = ('weight', 'edge')
+    shared = True
+
     def __init__(self, weight, edge):
+        super().__init__()
         self.weight = weight
         self.edge = edge
 
@@ -44,6 +73,9 @@ class Matter(Role):
 class Edible(Role):
     '''Something that can be eaten, for good or ill.'''
 
+    __slots__ = ('satiation', 'nutrition')
+    shared = True
+
     def __init__(self, satiation, nutrition):
         super().__init__()
         self.satiation = satiation
@@ -53,33 +85,49 @@ class Edible(Role):
 class Usable(Role):
     '''Something that can be "used" on another Entity.'''
 
+    __slots__ = ('on_use',)
+    shared = True
+
     def __init__(self, on_use):
         super().__init__()
         self.on_use = on_use
 
-    def use_on(self, entity):
-        '''Use the usable on another entity.'''
-        self.on_use(self, entity)
+    def use_on(self, tool, actor, target):
+        '''Have `actor` use `tool`, the entity this usable belongs to, on
+        `target`.
+
+        A usable may be shared among many entities (see `Role.shared`),
+        so the tool is passed in rather than taken from the role.
+        '''
+        self.on_use(tool, actor, target)
 
 
 class Weapon(Role):
     '''A tool for killing.'''
 
+    __slots__ = ('damage', 'accuracy', 'nhits')
+    shared = True
+
     def __init__(self, damage, accuracy, nhits):
+        super().__init__()
         self.damage = damage
         self.accuracy = accuracy
         self.nhits = nhits
 
-    def use_on(self, entity):
+    def use_on(self, tool, actor, target):
+        '''Have `actor` attack `target` with `tool`.'''
+        rng = target.plains.rng
         for i in range(self.nhits):
-            if random() * 100 > self.accuracy:
+            if rng.random() * 100 > self.accuracy:
                 continue
-            entity.damage(self.damage)
+            target.damage(self.damage)
 
 
 class Actor(Role):
     '''Something that acts each turn.'''
 
+    __slots__ = ('action',)
+
     def __init__(self, action):
         super().__init__()
         self.action = action
@@ -90,19 +138,34 @@ class Actor(Role):
 
 
 class Reactor(Role):
-    '''Something that reacts when engaged with.'''
+    '''Something that reacts when engaged with.
 
-    def __init__(self, action):
+    While its entity is on a plains, the reactor is subscribed to each
+    of the `nomad.events` types in `events` about its entity, and reacts
+    to them at the end of the turn they happen in.
+    '''
+
+    __slots__ = ('action', 'events')
+
+    def __init__(self, action, events=()):
         super().__init__()
         self.action = action
+        self.events = tuple(events)
 
-    def react_to(self, entity):
-        '''Perform an action in response to an Entity.'''
-        self.action(self.entity, entity)
+    def react_to(self, event):
+        '''Perform an action in response to an `Event`.'''
+        self.action(self.entity, event)
 
 
 class Mortal(Role):
-    '''Something that can die and requires sustainance to stay alive.'''
+    '''Something that can die and requires sustainance to stay alive.
+
+    While its entity is on a plains, a mortal's state lives in the
+    plains' `MortalStore`, which decays every mortal at once each turn;
+    the mortal itself is then a view into the store.
+    '''
+
+    __slots__ = ('_satiation', '_health', 'decay', 'store', 'slot')
 
     MIN_SATIATION = 0
     MAX_SATIATION = 100
@@ -111,14 +174,42 @@ class Mortal(Role):
 
     SATIATION_DECAY = 0.25
 
-    def __init__(self, satiation=MAX_SATIATION, health=MAX_HEALTH):
+    def __init__(self, satiation=MAX_SATIATION, health=MAX_HEALTH,
+                 decay=SATIATION_DECAY):
         super().__init__()
         self._satiation = satiation
         self._health = health
+        #: How much satiation is lost each turn.
+        self.decay = decay
+        #: The `MortalStore` holding the mortal's state, if any, and the
+        #: mortal's slot in it.
+        self.store = None
+        self.slot = None
+
+    def __getstate__(self):
+        '''Pickle the mortal apart from its store.'''
+        state = dict((slot, getattr(self, slot))
+                     for cls in type(self).__mro__
+                     for slot in cls.__dict__.get('__slots__', ())
+                     if hasattr(self, slot))
+        state.update(_satiation=self.satiation, _health=self.health,
+                     store=None, slot=None)
+        return None, state
+
+    def clone(self):
+        '''Return an unassigned copy of the mortal, apart from its store.'''
+        role = super().clone()
+        role._satiation = self.satiation
+        role._health = self.health
+        role.store = role.slot = None
+        return role
 
     def update(self, nomad):
-        '''Reduce satiation by a fixed amount.'''
-        self.satiation -= self.SATIATION_DECAY
+        '''Reduce satiation by a fixed amount, unless a `MortalStore`
+        does so.
+        '''
+        if self.store is None:
+            self.satiation -= self.decay
 
     def damage(self, dmg):
         if not self.health:
@@ -129,19 +220,44 @@ class Mortal(Role):
     @property
     def alive(self):
         '''Is the mortal alive?'''
-        return self.satiation > 0
+        return self.satiation > 0 and self.health > 0
+
+    @property
+    def cause_of_death(self):
+        '''Why the mortal died: 'starvation' or 'injury', or None if it
+        is alive.
+        '''
+        if self.satiation <= 0:
+            return 'starvation'
+        if self.health <= 0:
+            return 'injury'
+        return None
 
     def _get_satiation(self):
-        return self._satiation
+        if self.store is None:
+            return self._satiation
+        return self.store.satiation[self.slot]
     def _set_satiation(self, x):
-        self._satiation = max(self.MIN_SATIATION, min(self.MAX_SATIATION, x))
+        x = max(self.MIN_SATIATION, min(self.MAX_SATIATION, x))
+        if self.store is None:
+            self._satiation = x
+        else:
+            self.store.satiation[self.slot] = x
+            self.store.alive[self.slot] = self.alive
     satiation = property(_get_satiation, _set_satiation, doc=
         'How full is the mortal? If this reaches 0, death occurs.')
 
     def _get_health(self):
-        return self._health
+        if self.store is None:
+            return self._health
+        return self.store.health[self.slot]
     def _set_health(self, x):
-        self._health = max(self.MIN_HEALTH, min(self.MAX_HEALTH, x))
+        x = max(self.MIN_HEALTH, min(self.MAX_HEALTH, x))
+        if self.store is None:
+            self._health = x
+        else:
+            self.store.health[self.slot] = x
+            self.store.alive[self.slot] = self.alive
     health = property(_get_health, _set_health, doc=
         'How healthy is the mortal? If this reaches 0, death occurs.')
 
@@ -151,36 +267,52 @@ class Mortal(Role):
         if edible:
             self.satiation = self.satiation + edible.satiation
             self.health = self.health + edible.nutrition
+            bus = self.entity.plains.events
+            if bus.wants(Ate):
+                bus.post(Ate(self.entity, entity))
             return True
         return False
 
     def eat_nearest(self):
-        entity = self.select_in_reach()
-        if entity and self.as_mortal.eat(entity):
-            self.plains.remove_entity(entity)
+        entity = self.entity.select_in_reach()
+        if entity and self.eat(entity):
+            self.entity.plains.remove_entity(entity)
 
 
 class Tactile(Role):
     '''Something that has fine motor control.'''
 
-    def __init__(self, object_factory, left_held=None, right_held=None):
+    __slots__ = ('recipes', 'held_entities', 'crafted')
+
+    def __init__(self, recipes, left_held=None, right_held=None):
         super().__init__()
-        self.object_factory = object_factory
+        #: The `nomad.crafting.RecipeBook` the tactile crafts from.
+        self.recipes = recipes
         self.held_entities = [left_held, right_held]
+        #: How many usables the tactile has made.
+        self.crafted = 0
 
     def assign(self, entity):
         super().assign(entity)
 
+    def clone(self):
+        '''Return an unassigned copy of the tactile, with hands of its
+        own.
+        '''
+        role = super().clone()
+        role.held_entities = list(self.held_entities)
+        return role
+
     def eat_nearest(self):
         for i, entity in enumerate(self.held_entities):
-            if entity and self.as_mortal.eat(entity):
+            if entity and self.entity.as_mortal.eat(entity):
                 self.held_entities[i] = None
                 return
-        self.as_mortal.eat_nearest()
+        self.entity.as_mortal.eat_nearest()
 
     def pickup_nearest(self):
         # Get closest entity in reach.
-        entity = self.select_in_reach()
+        entity = self.entity.select_in_reach()
 
         # Quit if entity unmoveable.
         if not entity or not entity.moveable:
@@ -195,16 +327,19 @@ class Tactile(Role):
             return
 
         # Remove the entity from the plains.
-        self.plains.remove_entity(entity)
+        plains = self.entity.plains
+        plains.remove_entity(entity)
+        if plains.events.wants(PickedUp):
+            plains.events.post(PickedUp(self.entity, entity))
 
     def drop_left(self):
         '''Drop the entity in the tactile's left hand underfoot.'''
-        self.put_underfoot(self.held_entities[0])
+        self.entity.put_underfoot(self.held_entities[0])
         self.held_entities[0] = None
 
     def drop_right(self):
         '''Drop the entity in the tactile's right hand underfoot.'''
-        self.put_underfoot(self.held_entities[1])
+        self.entity.put_underfoot(self.held_entities[1])
         self.held_entities[1] = None
 
     def drop_all(self):
@@ -212,19 +347,135 @@ class Tactile(Role):
         self.drop_left()
         self.drop_right()
 
+    def items_to_hand(self):
+        '''Return the items the tactile can craft with, as (name, source)
+        pairs: held items first, whose source is the hand holding them,
+        then the entity underfoot and the entities in reach, whose source
+        is their (x, y, z) coordinates. The floor is never included.
+        '''
+        entity = self.entity
+        plains = entity.plains
+        items = [(part.name, i) for i, part in enumerate(self.held_entities)
+                 if part]
+        x, y = entity.x, entity.y
+        if entity.z > 1:
+            z = entity.z - 1
+            items.append((plains.get_entity(x, y, z).name, (x, y, z)))
+        for dx, dy in DIRECTIONS:
+            xy = (x + dx, y + dy)
+            if xy not in plains.entities:
+                continue
+            cell = plains.entities[xy]
+            if len(cell) > 1 and not cell[-1].walkable:
+                items.append((cell[-1].name, xy + (len(cell) - 1,)))
+        return items
+
     def combine_objects(self):
-        '''Attempt to make a usable with the entities on hand.'''
-        parts = frozenset(part.name for part in self.held_entities if part)
+        '''Make the best usable the tactile can out of what it holds, what
+        is underfoot and what is in reach, and put it underfoot. Return
+        the usable, or None if nothing could be made.
+        '''
+        items = self.items_to_hand()
+        recipe = self.recipes.best((name for name, _ in items),
+                                   self.entity.stats.intelligence)
+        if recipe is None:
+            return None
+
+        # Use up the ingredients, held items first.
+        needed = recipe.ingredients.copy()
+        plains = self.entity.plains
+        for name, source in items:
+            if not needed[name]:
+                continue
+            needed[name] -= 1
+            if isinstance(source, int):
+                self.held_entities[source] = None
+            else:
+                plains.remove_entity(plains.claim_entity(*source))
 
-        if parts not in self.object_factory:
-            return
+        usable = recipe.make()
+        self.entity.put_underfoot(usable)
+        self.crafted += 1
+        return usable
 
-        min_intelligence, usable = self.object_factory[parts]
-        if self.stats.intelligence < min_intelligence:
-            return
 
-        for i, part in enumerate(self.held_entities):
-            if part.name() in parts:
-                self.held_entities[i] = None
-            
-        self.put_underfoot(usable())
+@lru_cache(maxsize=None)
+def _slot_names(cls):
+    return tuple(slot for c in cls.__mro__
+                 for slot in c.__dict__.get('__slots__', ()))
+
+
+class MortalStore:
+    '''The state of many mortals, held in parallel typed arrays.
+
+    Each attached `Mortal` owns a slot in the arrays, and reads and writes
+    its satiation and health there. `update` then decays, clamps and
+    checks every mortal in a single pass over the arrays, rather than a
+    method call and two clamping properties per mortal. Slots freed by
+    `detach` are reused.
+    '''
+
+    def __init__(self):
+        self.satiation = array('d')
+        self.health = array('d')
+        self.decay = array('d')
+        self.alive = array('B')
+        #: The mortal in each slot, or None if the slot is free.
+        self.mortals = []
+        self.free = []
+
+    def __len__(self):
+        return len(self.mortals) - len(self.free)
+
+    def attach(self, mortal):
+        '''Move a mortal's state into the store.'''
+        if mortal.store is self:
+            return
+        satiation, health = mortal.satiation, mortal.health
+        if self.free:
+            slot = self.free.pop()
+            self.mortals[slot] = mortal
+        else:
+            slot = len(self.mortals)
+            self.mortals.append(mortal)
+            for arr in (self.satiation, self.health, self.decay, self.alive):
+                arr.append(0)
+        self.satiation[slot] = satiation
+        self.health[slot] = health
+        self.decay[slot] = mortal.decay
+        self.alive[slot] = satiation > 0 and health > 0
+        mortal.store = self
+        mortal.slot = slot
+
+    def detach(self, mortal):
+        '''Move a mortal's state back out of the store.'''
+        if mortal.store is not self:
+            return
+        slot = mortal.slot
+        mortal._satiation = self.satiation[slot]
+        mortal._health = self.health[slot]
+        mortal.store = mortal.slot = None
+        self.mortals[slot] = None
+        self.decay[slot] = 0
+        self.alive[slot] = 0
+        self.free.append(slot)
+
+    def update(self):
+        '''Reduce the satiation of every mortal by its decay rate, and
+        return the mortals that starved to death.
+        '''
+        satiation = self.satiation
+        alive = self.alive
+        least = Mortal.MIN_SATIATION
+        died = []
+        for slot, decay in enumerate(self.decay):
+            # Free slots have no decay, and so are skipped.
+            if decay:
+                x = satiation[slot] - decay
+                if x <= least:
+                    x = least
+                    if alive[slot]:
+                        alive[slot] = 0
+                        died.append(self.mortals[slot])
+                satiation[slot] = x
+        return died
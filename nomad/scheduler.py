@@ -0,0 +1,65 @@
+'''scheduling of the entities that act each turn'''
+from nomad.roles import MortalStore
+from nomad.telemetry import stats as telemetry
+
+
+def is_active(entity):
+    '''Does the entity have a role that must be updated each turn?'''
+    return entity.as_actor is not None or entity.as_mortal is not None
+
+
+class Scheduler:
+    '''An index of the active entities on a `Plains`, which updates only
+    those each turn.
+
+    Inert entities, like floors and plants, are never indexed, so the
+    cost of a turn scales with the number of actors rather than the area
+    of the plains. The state of indexed mortals is kept in a
+    `MortalStore`, which updates them all in one pass.
+
+    ``turn`` counts the turns updated so far.
+    '''
+
+    def __init__(self):
+        # Used as an ordered set, so that turns play out deterministically.
+        self.active = {}
+        self.mortals = MortalStore()
+        self.turn = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, entity):
+        return entity in self.active
+
+    def add(self, entity):
+        '''Index the entity if it is active.'''
+        if is_active(entity):
+            self.active[entity] = None
+            if entity.as_mortal is not None:
+                self.mortals.attach(entity.as_mortal)
+
+    def discard(self, entity):
+        '''Stop updating the entity, if it was indexed.'''
+        if self.active.pop(entity, 0) is None and entity.as_mortal is not None:
+            self.mortals.detach(entity.as_mortal)
+
+    def update(self, nomad):
+        '''Update each active entity with the `Nomad`.
+
+        The pass walks a snapshot of the index, so entities may freely be
+        added, moved or removed while it runs: entities added during the
+        pass wait until the next turn, and entities removed during the
+        pass are skipped if they have not been updated yet. Actors act
+        first, in turn order, and then every mortal decays at once.
+        '''
+        updated = 0
+        for entity in list(self.active):
+            if entity.as_actor is not None and entity in self.active:
+                entity.update(nomad)
+                updated += 1
+        died = self.mortals.update()
+        self.turn += 1
+        telemetry.count('updated', updated + len(self.mortals))
+        if died:
+            telemetry.count('died', len(died))
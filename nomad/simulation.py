@@ -0,0 +1,129 @@
+'''run the game headless, without curses'''
+import random
+
+from nomad.commands import (DIRECTION_NAMES, game_command_names,
+                            named_commands)
+from nomad.content import default as default_content
+from nomad.entities import *
+from nomad.nomad import Nomad
+from nomad.plains import Plains
+import nomad.plainsgen as gen
+from nomad.telemetry import stats as telemetry
+from nomad.util import *
+from nomad.world import World
+
+
+def default_generator(seed=None):
+    '''Return the generator used to fill the plains of a normal game.'''
+    return gen.chance(default_content().generator_table(kinds), seed)
+
+
+def new_world(los=6, generate=None, seed=None, persistent=False,
+              **world_kws):
+    '''Return a new `Nomad` standing at the center of a new `Plains`.
+
+    `generate` is a `nomad.plainsgen` generator; if not given, the
+    `default_generator` is used, seeded with `seed`.
+
+    If `persistent` is true, the plains is laid over a `World` seeded
+    with `seed`, which keeps what leaves the nomad's sight; any other
+    keyword arguments are passed on to the `World`.
+    '''
+    if generate is None:
+        generate = default_generator(seed)
+
+    # Define the nomad.
+    nomad = Nomad(los=los)
+    # Define the plains.
+    half_los = los // 2 + 1
+    shape = dict(up=-los, left=-los, right=los, down=los,
+                 ul=Point(-half_los, -half_los),
+                 ur=Point(-half_los, half_los),
+                 lr=Point(half_los, half_los),
+                 ll=Point(half_los, -half_los),)
+    if persistent:
+        world = World(generate, earth, seed or 0, **world_kws)
+        plains = Plains.in_world(world, **shape)
+    else:
+        plains = Plains.with_floor(earth, generate, **shape)
+    plains.rng.seed(seed)
+    # Add nomad to plains.
+    plains.add_entity(nomad, 0, 0)
+    return nomad, plains
+
+
+def update_entities(nomad, plains):
+    '''Update each active `Entity` in the `Plains` with the `Nomad`, then
+    hand out the events of the turn.
+    '''
+    with telemetry.phase('update'):
+        plains.scheduler.update(nomad)
+        plains.events.flush()
+
+
+def random_commands(seed=None):
+    '''Yield command and direction names chosen at random, forever.'''
+    rng = random.Random(seed)
+    names = game_command_names()
+    while True:
+        yield rng.choice(names)
+
+
+class Simulation:
+    '''A game of Nomad that runs without a user interface.
+
+    `commands` is an iterable of command names (see
+    `nomad.commands.named_commands`), standing in for the keyboard. When
+    the nomad must select an entity in reach, names are taken from the
+    same stream until a direction name (see
+    `nomad.commands.DIRECTION_NAMES`) comes up, just as the curses
+    interface waits for a direction key.
+
+    Any other keyword arguments are passed on to `new_world`.
+    '''
+
+    def __init__(self, commands, los=6, generate=None, seed=None,
+                 **world_kws):
+        self.commands = iter(commands)
+        self.command_dict = named_commands()
+        self.nomad, self.plains = new_world(los, generate, seed, **world_kws)
+        self.nomad.ui = self
+        self.turn = 0
+
+    def select_adjacent_entity(self):
+        '''Select an entity adjacent to the nomad from the next direction
+        name in the command stream.
+        '''
+        name = next(self.commands)
+        while name not in DIRECTION_NAMES:
+            name = next(self.commands)
+        return self.nomad.reach(*DIRECTION_NAMES[name])
+
+    def interact(self):
+        '''Perform the next command in the command stream.'''
+        name = next(self.commands)
+        if name in self.command_dict:
+            self.command_dict[name](self.nomad)
+
+    def step(self):
+        '''Play a single turn.'''
+        with telemetry.phase('input'):
+            self.interact()
+        update_entities(self.nomad, self.plains)
+        self.turn += 1
+        telemetry.count('turns')
+
+    def run(self, turns=None):
+        '''Play until the nomad dies, the command stream runs dry or,
+        if given, `turns` turns have passed. Return the number of turns
+        played.
+        '''
+        start = self.turn
+        while self.nomad.as_mortal.alive:
+            if turns is not None and self.turn - start >= turns:
+                break
+            try:
+                self.step()
+            except StopIteration:
+                break
+        return self.turn - start
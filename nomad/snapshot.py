@@ -0,0 +1,231 @@
+'''compact binary snapshots of a game in progress
+
+A snapshot holds the nomad, every cell of the plains and, if the plains
+lies in a `World`, every chunk the world holds in memory. Cells are
+stored as flat typed arrays of entity kind ids, so saving and loading a
+big plains costs little more than copying a few buffers. Entities whose
+state a kind id can't capture (anything mortal or tactile, and kinds not
+in `entities.kinds`) are pickled into a sparse side table instead.
+
+The state of the plains' random number generators is saved too, as is
+that of its generator if it exposes one (see `nomad.plainsgen`), so that
+a game picks up from a snapshot exactly as it would have gone on.
+
+A snapshot is laid out as the magic bytes, the length of the header as a
+little-endian uint32, the pickled header, and then the arrays the header
+describes, back to back.
+'''
+from array import array
+import mmap
+import pickle
+import struct
+
+from nomad import entities
+from nomad.plains import Octagon, Plains
+from nomad.util import *
+from nomad.world import World
+
+MAGIC = b'NOMADSNP'
+VERSION = 2
+
+#: The kind id of an entity kept in the side table.
+STATEFUL = 0xFFFF
+
+_header_len = struct.Struct('<I')
+
+
+def is_stateless(entity):
+    '''Can the entity be rebuilt from its kind alone?'''
+    return (entity.name in entities.kinds and
+            entity.as_mortal is None and
+            entity.as_tactile is None and
+            not entity.held_entities)
+
+
+class _Encoder:
+    '''Accumulates cells into flat arrays.'''
+
+    def __init__(self):
+        self.kind_ids = {}
+        self.heights = array('H')
+        self.kinds = array('H')
+        self.side = []
+
+    def add_cell(self, cell):
+        self.heights.append(len(cell))
+        for entity in cell:
+            if is_stateless(entity):
+                if entity.name not in self.kind_ids:
+                    self.kind_ids[entity.name] = len(self.kind_ids)
+                self.kinds.append(self.kind_ids[entity.name])
+            else:
+                self.kinds.append(STATEFUL)
+                self.side.append(entity)
+
+    def side_index(self, entity):
+        for i, e in enumerate(self.side):
+            if e is entity:
+                return i
+
+
+class _Decoder:
+    '''Rebuilds cells from the flat arrays of an `_Encoder`.'''
+
+    def __init__(self, kind_names, heights, kinds, side):
+        self.factories = [entities.kinds[name] for name in kind_names]
+        self.heights = iter(heights)
+        self.kinds = iter(kinds)
+        self.side = iter(side)
+
+    def next_cell(self):
+        cell = []
+        for _ in range(next(self.heights)):
+            kind = next(self.kinds)
+            if kind == STATEFUL:
+                cell.append(next(self.side))
+            else:
+                cell.append(self.factories[kind]())
+        return cell
+
+
+def dumps(nomad, plains):
+    '''Return a snapshot of the nomad and its plains, as bytes.'''
+    encoder = _Encoder()
+    points = plains.entities.geometry.points
+    for xy in points:
+        encoder.add_cell(plains.entities[xy])
+
+    # Record the turn order, as (cell index, z) pairs.
+    cell_index = dict((xy, i) for i, xy in enumerate(points))
+    schedule = array('I')
+    for entity in plains.scheduler.active:
+        schedule.extend((cell_index[entity.pos],
+                         plains.entities[entity.pos].index(entity)))
+
+    # Record the chunks of the world, as (cx, cy, number of cells)
+    # triples and the world coordinates of their cells.
+    world = plains.world
+    chunk_keys = array('i')
+    cell_coords = array('i')
+    if world is not None:
+        for (cx, cy), chunk in world.chunks.items():
+            chunk_keys.extend((cx, cy, len(chunk)))
+            for (wx, wy), cell in chunk.items():
+                cell_coords.extend((wx, wy))
+                encoder.add_cell(cell)
+
+    named_arrays = (('heights', encoder.heights),
+                    ('kinds', encoder.kinds),
+                    ('schedule', schedule),
+                    ('chunk_keys', chunk_keys),
+                    ('cell_coords', cell_coords))
+    layout = {}
+    offset = 0
+    for name, arr in named_arrays:
+        layout[name] = (arr.typecode, offset, len(arr))
+        offset += len(arr) * arr.itemsize
+
+    header = pickle.dumps({
+        'version': VERSION,
+        'shape': plains.entities.params[:-1],
+        'origin': tuple(plains.origin),
+        'floor': plains.floor_entity().name,
+        'kinds': sorted(encoder.kind_ids, key=encoder.kind_ids.get),
+        'side': encoder.side,
+        'nomad': encoder.side_index(nomad),
+        'world': world and dict(seed=world.seed,
+                                chunk_size=world.chunk_size,
+                                capacity=world.capacity),
+        'layout': layout,
+        'rng': plains.rng.getstate(),
+        'generate_rng': (plains.generate.rng.getstate()
+                         if hasattr(plains.generate, 'rng') else None),
+        'prefetch_seeds': plains.prefetch_seeds,
+        }, pickle.HIGHEST_PROTOCOL)
+
+    return b''.join([MAGIC, _header_len.pack(len(header)), header] +
+                    [arr.tobytes() for _, arr in named_arrays])
+
+
+def loads(data, generate, store=None):
+    '''Return a (nomad, plains) pair rebuilt from a snapshot.
+
+    `data` may be any buffer, such as bytes or an `mmap.mmap`; its arrays
+    are read in place rather than copied. The plains' `generate`
+    function, and its world's `store` if it had a world, can't be saved,
+    so they must be supplied again.
+    '''
+    view = memoryview(data)
+    arrays = {}
+    try:
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a nomad snapshot')
+        start = len(MAGIC) + _header_len.size
+        header_len, = _header_len.unpack_from(view, len(MAGIC))
+        header = pickle.loads(view[start:start + header_len])
+        if header['version'] != VERSION:
+            raise ValueError('unsupported snapshot version {}'.format(
+                             header['version']))
+        blob = view[start + header_len:]
+
+        for name, (typecode, offset, count) in header['layout'].items():
+            size = array(typecode).itemsize
+            arrays[name] = blob[offset:offset + count * size].cast(typecode)
+        return _rebuild(header, arrays, generate, store)
+    finally:
+        # Release every view, so that an mmap can be closed.
+        for arr in arrays.values():
+            arr.release()
+        view.release()
+
+
+def _rebuild(header, arrays, generate, store):
+    decoder = _Decoder(header['kinds'], arrays['heights'], arrays['kinds'],
+                       header['side'])
+    floor_entity = entities.kinds[header['floor']]
+
+    cells = Octagon(*header['shape'])
+    points = cells.geometry.points
+    for xy in points:
+        cells[xy] = decoder.next_cell()
+
+    world = None
+    if header['world'] is not None:
+        world = World(generate, floor_entity, store=store, **header['world'])
+        coords = iter(arrays['cell_coords'])
+        keys = arrays['chunk_keys']
+        for i in range(0, len(keys), 3):
+            cx, cy, ncells = keys[i:i + 3]
+            chunk = world.chunks[(cx, cy)] = {}
+            for _ in range(ncells):
+                chunk[Point(next(coords), next(coords))] = decoder.next_cell()
+
+    plains = Plains(cells, floor_entity, generate, world,
+                    Point(*header['origin']))
+    plains.rng.setstate(header['rng'])
+    if header['generate_rng'] is not None and hasattr(generate, 'rng'):
+        generate.rng.setstate(header['generate_rng'])
+    plains.prefetch_seeds = dict(header['prefetch_seeds'])
+
+    # Restore the turn order.
+    schedule = arrays['schedule']
+    plains.scheduler.active = dict.fromkeys(
+        plains.entities[points[schedule[i]]][schedule[i + 1]]
+        for i in range(0, len(schedule), 2))
+
+    return header['side'][header['nomad']], plains
+
+
+def save(path, nomad, plains):
+    '''Write a snapshot of the nomad and its plains to a file.'''
+    with open(path, 'wb') as f:
+        f.write(dumps(nomad, plains))
+
+
+def load(path, generate, store=None):
+    '''Read a snapshot from a file, mapping it into memory rather than
+    reading it. See `loads`.
+    '''
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return loads(data, generate, store)
@@ -0,0 +1,108 @@
+'''indexes of where things are on the plains'''
+from collections import defaultdict
+
+from nomad.entity import ROLE_NAMES
+from nomad.util import *
+
+#: Queries matching at most this many points scan them all; queries
+#: matching more search outward from the origin point instead.
+SCAN_LIMIT = 64
+
+
+class SpatialIndex:
+    '''Where each kind of entity, and each role, can be found.
+
+    Points are kept in world coordinates, so shifting the plains only
+    touches the points that leave and enter it. Each point is counted
+    once for every matching entity stacked on it.
+    '''
+
+    def __init__(self):
+        # Counts of entities at each point, by ('name', name) and
+        # ('role', role_name).
+        self.points = defaultdict(dict)
+        # The point counts each entity name is indexed under.
+        self._counts = {}
+
+    def _counts_of(self, entity):
+        counts = self._counts.get(entity.name)
+        if counts is None:
+            keys = (('name', entity.name),) + tuple(
+                ('role', role_name) for role_name in ROLE_NAMES
+                if entity.get_role(role_name) is not None)
+            counts = self._counts[entity.name] = tuple(
+                self.points[key] for key in keys)
+        return counts
+
+    def add(self, entity, wx, wy):
+        '''Index an entity at (wx, wy).'''
+        xy = Point(wx, wy)
+        for counts in self._counts_of(entity):
+            counts[xy] = counts.get(xy, 0) + 1
+
+    def remove(self, entity, wx, wy):
+        '''Stop indexing an entity at (wx, wy).'''
+        xy = Point(wx, wy)
+        for counts in self._counts_of(entity):
+            n = counts[xy] - 1
+            if n:
+                counts[xy] = n
+            else:
+                del counts[xy]
+
+    def add_cell(self, entities, wx, wy):
+        '''Index a whole stack of entities at (wx, wy).'''
+        xy = Point(wx, wy)
+        for entity in entities:
+            for counts in self._counts_of(entity):
+                counts[xy] = counts.get(xy, 0) + 1
+
+    def remove_cell(self, entities, wx, wy):
+        '''Stop indexing a whole stack of entities at (wx, wy).'''
+        xy = Point(wx, wy)
+        for entity in entities:
+            for counts in self._counts_of(entity):
+                n = counts[xy] - 1
+                if n:
+                    counts[xy] = n
+                else:
+                    del counts[xy]
+
+    def find(self, name=None, role=None):
+        '''Return the points holding an entity with the given name, or
+        the given role.
+        '''
+        if name is not None:
+            return self.points[('name', name)].keys()
+        return self.points[('role', role)].keys()
+
+    def nearest(self, wx, wy, name=None, role=None, radius=None):
+        '''Return the nearest point to (wx, wy) holding an entity with the
+        given name, or the given role, no farther than `radius` steps
+        away if given. Return None if there is no such point.
+
+        Distance is counted in steps, diagonals included.
+        '''
+        points = self.find(name, role)
+        if not points:
+            return None
+
+        if len(points) <= SCAN_LIMIT or radius is None:
+            def steps(xy):
+                return max(abs(xy[0] - wx), abs(xy[1] - wy))
+            best = min(points, key=lambda xy: (steps(xy), xy[1], xy[0]))
+            if radius is not None and steps(best) > radius:
+                return None
+            return best
+
+        # Search ring by ring; the first match is among the nearest.
+        for r in range(radius + 1):
+            for y in range(wy - r, wy + r + 1):
+                if y in (wy - r, wy + r):
+                    xs = range(wx - r, wx + r + 1)
+                else:
+                    xs = (wx - r, wx + r)
+                for x in xs:
+                    if (x, y) in points:
+                        return Point(x, y)
+        return None
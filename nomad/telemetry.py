@@ -0,0 +1,90 @@
+'''instrumentation of where each turn's time goes
+
+The game reports to the shared `stats`: phases are timed with
+``stats.phase(name)`` and events counted with ``stats.count(name)``.
+Phases may nest, in which case an outer phase's time includes the inner
+phase's.
+'''
+from collections import defaultdict
+from contextlib import contextmanager
+import cProfile
+import json
+import time
+
+
+class Telemetry:
+    '''Phase timers and event counters, with a profiler that can be
+    switched on and off at any time.
+    '''
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.profiler = None
+        self.profiling = False
+
+    def reset(self):
+        '''Forget everything recorded so far, and stop profiling.'''
+        self.stop_profiling()
+        self.__init__()
+
+    @contextmanager
+    def phase(self, name):
+        '''Time the body of a ``with`` block as the named phase.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        '''Count `n` occurrences of the named event.'''
+        self.counters[name] += n
+
+    def start_profiling(self):
+        '''Start, or resume, profiling with `cProfile`.'''
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+        if not self.profiling:
+            self.profiler.enable()
+            self.profiling = True
+
+    def stop_profiling(self):
+        '''Pause profiling, keeping what was profiled so far.'''
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+
+    def toggle_profiling(self):
+        if self.profiling:
+            self.stop_profiling()
+        else:
+            self.start_profiling()
+
+    def summary(self):
+        '''Return everything recorded so far, as a dict.'''
+        return {
+            'phases': dict(
+                (name, {'total': self.times[name],
+                        'calls': self.calls[name],
+                        'mean': self.times[name] / self.calls[name]})
+                for name in sorted(self.times)),
+            'counters': dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path):
+        '''Write the `summary` as JSON to `path` and, if anything was
+        profiled, the profile to `path` + ``'.prof'`` (readable with
+        `pstats`). Profiling stops.
+        '''
+        self.stop_profiling()
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        if self.profiler is not None:
+            self.profiler.dump_stats(path + '.prof')
+
+
+#: The telemetry the game reports to.
+stats = Telemetry()
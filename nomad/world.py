@@ -0,0 +1,120 @@
+'''the persistent world the plains moves across'''
+from collections import OrderedDict
+import random
+
+from nomad.util import *
+
+CHUNK_SIZE = 16
+CAPACITY = 64
+
+
+class World:
+    '''An endless grid of cells in world coordinates, kept in square
+    chunks of `chunk_size` cells a side.
+
+    A chunk is generated the first time it is used, by calling
+    `generate` with this world (standing in for a `Plains`) and a
+    `random.Random` seeded from `seed` and the chunk's coordinates, so a
+    given seed always yields the same chunks.
+
+    At most `capacity` chunks are kept in memory, the least recently used
+    being evicted first. Evicted chunks are written to `store`, if given:
+    a mapping from strings to picklable values, such as a
+    `shelve.Shelf`. Otherwise they are forgotten, along with any changes
+    made to them, and regenerated when next used.
+
+    Cells are moved in and out of the world: `take` hands a cell over to
+    the plains and `put` hands it back, so a chunk only ever holds the
+    cells that are out of sight.
+    '''
+
+    def __init__(self, generate, floor_entity, seed=0,
+                 chunk_size=CHUNK_SIZE, capacity=CAPACITY, store=None):
+        self.generate = generate
+        self.floor_entity = floor_entity
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.capacity = capacity
+        self.store = store
+        self.chunks = OrderedDict()
+        # Futures of chunks being generated ahead of time, by coordinates.
+        self.pending = {}
+
+    def chunk_key(self, wx, wy):
+        '''Return the coordinates of the chunk holding (wx, wy).'''
+        return wx // self.chunk_size, wy // self.chunk_size
+
+    def _store_key(self, key):
+        return '{},{}'.format(*key)
+
+    def _generate_chunk(self, cx, cy):
+        size = self.chunk_size
+        coords = [Point(x, y)
+                  for y in range(cy * size, (cy + 1) * size)
+                  for x in range(cx * size, (cx + 1) * size)]
+        rng = random.Random('{}:{}:{}'.format(self.seed, cx, cy))
+        return self.generate(self, coords, rng)
+
+    def get_chunk(self, key):
+        '''Return the chunk with the given coordinates: a dict mapping
+        world points to lists of entities.
+        '''
+        chunks = self.chunks
+        if key in chunks:
+            chunks.move_to_end(key)
+            return chunks[key]
+
+        store_key = self._store_key(key)
+        if key in self.pending:
+            chunk = self.pending.pop(key).result()
+        elif self.store is not None and store_key in self.store:
+            chunk = self.store[store_key]
+            del self.store[store_key]
+        else:
+            chunk = self._generate_chunk(*key)
+        chunks[key] = chunk
+
+        while len(chunks) > self.capacity:
+            self.evict()
+        return chunk
+
+    def prefetch(self, executor, keys):
+        '''Start generating the chunks with the given coordinates, using
+        `executor` (a `concurrent.futures.Executor`), unless they are
+        already in memory or in the store.
+
+        Chunks still pending from an earlier call that are not among
+        `keys` are abandoned.
+        '''
+        for key in list(self.pending):
+            if key not in keys:
+                self.pending.pop(key).cancel()
+        for key in keys:
+            if key in self.chunks or key in self.pending:
+                continue
+            if self.store is not None and self._store_key(key) in self.store:
+                continue
+            self.pending[key] = executor.submit(self._generate_chunk, *key)
+
+    def evict(self):
+        '''Evict the least recently used chunk.'''
+        key, chunk = self.chunks.popitem(last=False)
+        if self.store is not None:
+            self.store[self._store_key(key)] = chunk
+
+    def take(self, wx, wy):
+        '''Remove and return the list of entities at (wx, wy).'''
+        chunk = self.get_chunk(self.chunk_key(wx, wy))
+        return chunk.pop((wx, wy))
+
+    def put(self, wx, wy, entities):
+        '''Place a list of entities at (wx, wy).'''
+        chunk = self.get_chunk(self.chunk_key(wx, wy))
+        chunk[Point(wx, wy)] = entities
+
+    def flush(self):
+        '''Write every chunk in memory to the store, if there is one.'''
+        if self.store is None:
+            return
+        while self.chunks:
+            self.evict()
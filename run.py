@@ -1,6 +1,23 @@
 #!/usr/bin/env python
+import argparse
+
 from nomad import game
 
 if __name__ == '__main__':
-    game.run()
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stats', metavar='PATH',
+                        help='write timing stats to PATH when the game ends')
+    parser.add_argument('--tick', metavar='SECONDS', type=float,
+                        default=game.TICK,
+                        help='seconds between turns of the world '
+                             '(default: %(default)s)')
+    parser.add_argument('--turn-based', action='store_true',
+                        help='let the world take a turn only after each key')
+    parser.add_argument('--seed', type=int,
+                        help='seed to generate the world from')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record the game to PATH, to be replayed with '
+                             '`python -m nomad.replay`')
+    args = parser.parse_args()
+    game.run(args.stats, None if args.turn_based else args.tick,
+             args.seed, args.record)